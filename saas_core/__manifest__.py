@@ -1,6 +1,6 @@
 {
     'name': 'SaaS Instance Manager',
-    'version': '18.0.3.0.0',
+    'version': '18.0.3.1.0',
     'category': 'SaaS',
     'summary': 'Provision and manage multi-tenant Odoo instances with Docker containers',
     'description': """
@@ -33,6 +33,7 @@ Key capabilities:
         'data/ir_config_parameter.xml',
         'data/saas_backup_cron.xml',
         'data/saas_storage_check_cron.xml',
+        'data/saas_container_refresh_cron.xml',
         'views/saas_plan_views.xml',
         'views/saas_instance_views.xml',
         'views/saas_ssh_key_pair_views.xml',
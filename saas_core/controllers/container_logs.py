@@ -48,6 +48,7 @@ class ContainerLogsController(http.Controller):
         safe_name = shlex.quote(container_name)
 
         def generate():
+            channel = None
             try:
                 ssh_conn._connect()
                 transport = ssh_conn._client.get_transport()
@@ -89,6 +90,10 @@ class ContainerLogsController(http.Controller):
                 _logger.exception("Log streaming error for container %s", container_name)
                 yield ('event: error\ndata: %s\n\n' % json.dumps(str(e))).encode('utf-8')
             finally:
+                # Close the channel so the remote `docker logs -f` exits
+                # before the client goes back to the SSH pool.
+                if channel is not None:
+                    channel.close()
                 ssh_conn._disconnect()
 
         return Response(
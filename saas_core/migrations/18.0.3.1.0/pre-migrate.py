@@ -0,0 +1,21 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Convert the instance port columns from text to integer."""
+    if not version:
+        return
+
+    _logger.info("Pre-migration: converting saas_instance port columns to integer")
+
+    # Values that are not a valid port number could never be used by the
+    # container anyway; they become NULL and are reassigned on next deploy.
+    cr.execute("""
+        ALTER TABLE saas_instance
+        ALTER COLUMN xmlrpc_port TYPE integer
+            USING CASE WHEN xmlrpc_port ~ '^[0-9]{1,5}$' THEN xmlrpc_port::integer END,
+        ALTER COLUMN longpolling_port TYPE integer
+            USING CASE WHEN longpolling_port ~ '^[0-9]{1,5}$' THEN longpolling_port::integer END;
+    """)
@@ -2,6 +2,7 @@ from . import saas_instance
 from . import saas_plan
 from . import res_config_settings
 from . import saas_ssh_key_pair
+from . import saas_server_mixin
 from . import saas_docker_server
 from . import saas_docker_container
 from . import saas_db_server
@@ -1,10 +1,16 @@
+import heapq
 import logging
+from collections import defaultdict
 
-from odoo import api, fields, models, _
+from odoo import Command, api, fields, models, tools, _
 from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
 
+# Fields whose changes invalidate the cached _get_install_order() and
+# saas.instance.module.line._get_all_technical_names()
+_INSTALL_ORDER_FIELDS = {'saas_dependency_ids', 'saas_module_ids', 'technical_name'}
+
 
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
@@ -21,6 +27,7 @@ class ProductTemplate(models.Model):
     )
     technical_name = fields.Char(
         string='Technical Name',
+        index=True,
         help='Odoo technical module name as used in the CLI and manifest '
              '(e.g. "sale", "account", "purchase").',
     )
@@ -68,9 +75,17 @@ class ProductTemplate(models.Model):
         string='Module Author',
         help='Author of the module as declared in the Odoo manifest file.',
     )
+    saas_icon_hash = fields.Char(
+        string='Icon Stamp',
+        readonly=True,
+        copy=False,
+        help='Modification time and size of the icon the image was fetched '
+             'from. The icon is only fetched again when this changes.',
+    )
     saas_module_count = fields.Integer(
         string='Module Count',
         compute='_compute_saas_module_count',
+        store=True,
         help='Number of modules included in this bundle.',
     )
 
@@ -120,10 +135,57 @@ class ProductTemplate(models.Model):
         ),
     ]
 
+    def init(self):
+        super().init()
+        # Covers the saas_type / version domains used by views and fetch flows
+        tools.create_index(
+            self.env.cr, 'product_template_saas_type_version_idx',
+            self._table, ['saas_type', 'saas_odoo_version_id'],
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if any(vals.get(fname) for vals in vals_list for fname in _INSTALL_ORDER_FIELDS):
+            self.env.registry.clear_cache()  # install order / technical names
+        return records
+
+    def write(self, vals):
+        # Clearing the registry cache drops every ormcache in every worker,
+        # so it only happens when the install graph really changed.
+        fnames = _INSTALL_ORDER_FIELDS.intersection(vals)
+        if not fnames or self.env.context.get('skip_install_order_cache_clear'):
+            return super().write(vals)
+        before = self._get_install_order_values(fnames)
+        res = super().write(vals)
+        if self._get_install_order_values(fnames) != before:
+            self.env.registry.clear_cache()  # install order / technical names
+        return res
+
+    def _get_install_order_values(self, fnames):
+        """Return the values of ``fnames`` per record, comparable across writes."""
+        return [
+            tuple(
+                frozenset(rec[fname].ids) if self._fields[fname].relational else rec[fname]
+                for fname in sorted(fnames)
+            )
+            for rec in self
+        ]
+
     def unlink(self):
         """When deleting a bundle, also delete its linked version repo and custom modules."""
+        # saas_bundle_module_rel has no inverse field, so the stored module
+        # count of the bundles losing a module is flagged by hand, once the
+        # rows are gone (unlink() flushes pending recomputes before deleting)
+        bundles = self.with_context(active_test=False).search([
+            ('saas_module_ids', 'in', self.ids),
+            ('id', 'not in', self.ids),
+        ])
         if self.env.context.get('skip_repo_cleanup'):
-            return super().unlink()
+            res = super().unlink()
+            bundles.modified(['saas_module_ids'])
+            self.env.registry.clear_cache()  # install order / technical names
+            return res
 
         repos_to_delete = self.env['saas.version.repo']
         modules_to_delete = self.env['product.template']
@@ -141,6 +203,8 @@ class ProductTemplate(models.Model):
         if modules_to_delete:
             modules_to_delete.with_context(skip_repo_cleanup=True).unlink()
         res = super().unlink()
+        bundles.modified(['saas_module_ids'])
+        self.env.registry.clear_cache()  # install order / technical names
         # Delete repos (triggers server cleanup + instance restart)
         if repos_to_delete:
             repos_to_delete.unlink()
@@ -148,8 +212,122 @@ class ProductTemplate(models.Model):
 
     @api.depends('saas_module_ids')
     def _compute_saas_module_count(self):
+        counts = {}
+        stored_ids = [rec_id for rec_id in self.ids if rec_id]
+        if stored_ids:
+            self.flush_model(['saas_module_ids'])
+            self.env.cr.execute("""
+                SELECT bundle_id, COUNT(module_id)
+                FROM saas_bundle_module_rel
+                WHERE bundle_id = ANY(%s)
+                GROUP BY bundle_id
+            """, (stored_ids,))
+            counts = dict(self.env.cr.fetchall())
         for rec in self:
-            rec.saas_module_count = len(rec.saas_module_ids)
+            if rec.id:
+                rec.saas_module_count = counts.get(rec.id, 0)
+            else:
+                # Unsaved record (form onchange): count the in-memory value
+                rec.saas_module_count = len(rec.saas_module_ids)
+
+    def _set_saas_dependencies(self, deps_map, modules):
+        """Link modules to their dependencies, as found by a module scan.
+
+        Only modules whose dependencies changed are written, one write per
+        distinct dependency set, and the install order cache is cleared
+        once at the end.
+
+        Args:
+            deps_map: dict technical name -> list of dependency technical names
+            modules: dict technical name -> product.template module
+        """
+        to_link = defaultdict(lambda: self.browse())
+        for tech_name, dep_names in deps_map.items():
+            record = modules.get(tech_name)
+            if not record:
+                continue
+            dep_ids = frozenset(modules[name].id for name in dep_names if name in modules)
+            if frozenset(record.saas_dependency_ids.ids) != dep_ids:
+                to_link[dep_ids] |= record
+        for dep_ids, records in to_link.items():
+            records.with_context(skip_install_order_cache_clear=True).write({
+                'saas_dependency_ids': [Command.set(list(dep_ids))],
+            })
+        if to_link:
+            self.env.registry.clear_cache()  # install order / technical names
+
+    @api.model
+    @tools.ormcache('frozenset(product_ids)')
+    def _get_install_order(self, product_ids):
+        """Return the technical names to install for the given products.
+
+        Bundles are expanded to their modules and the dependency graph is
+        followed transitively, all in one SQL query. The names are then
+        sorted topologically (Kahn's algorithm, ties broken by name) so that
+        dependencies come before the modules needing them.
+
+        Args:
+            product_ids: ids of product.template modules and/or bundles
+
+        Returns:
+            tuple: technical module names, dependencies first
+        """
+        if not product_ids:
+            return ()
+        self.flush_model(['technical_name', 'saas_dependency_ids', 'saas_module_ids'])
+        self.env.cr.execute("""
+            WITH RECURSIVE seed(id) AS (
+                SELECT p.id
+                  FROM unnest(%s::int[]) AS p(id)
+                 WHERE NOT EXISTS (
+                       SELECT 1 FROM saas_bundle_module_rel b WHERE b.bundle_id = p.id)
+                 UNION
+                SELECT b.module_id
+                  FROM saas_bundle_module_rel b
+                 WHERE b.bundle_id = ANY(%s)
+            ), closure(id) AS (
+                SELECT id FROM seed
+                 UNION
+                SELECT d.dependency_id
+                  FROM saas_product_dependency_rel d
+                  JOIN closure c ON c.id = d.product_id
+            )
+            SELECT t.id, t.technical_name, d.dependency_id
+              FROM closure c
+              JOIN product_template t ON t.id = c.id
+         LEFT JOIN saas_product_dependency_rel d ON d.product_id = c.id
+             WHERE t.technical_name IS NOT NULL
+        """, (list(product_ids), list(product_ids)))
+
+        names = {}
+        depends = defaultdict(set)
+        for product_id, technical_name, dependency_id in self.env.cr.fetchall():
+            names[product_id] = technical_name
+            if dependency_id:
+                depends[product_id].add(dependency_id)
+
+        dependents = defaultdict(list)
+        in_degree = dict.fromkeys(names, 0)
+        for product_id, dependency_ids in depends.items():
+            for dependency_id in dependency_ids:
+                if dependency_id in names:
+                    dependents[dependency_id].append(product_id)
+                    in_degree[product_id] += 1
+
+        ready = [(names[pid], pid) for pid, degree in in_degree.items() if not degree]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            name, pid = heapq.heappop(ready)
+            order.append(name)
+            for dependent in dependents[pid]:
+                in_degree[dependent] -= 1
+                if not in_degree[dependent]:
+                    heapq.heappush(ready, (names[dependent], dependent))
+        if len(order) < len(names):
+            # Dependency cycle: append the rest, Odoo sorts it out on install
+            order.extend(sorted(names[pid] for pid, degree in in_degree.items() if degree))
+        return tuple(order)
 
     # ========== Repo Actions ==========
 
@@ -267,6 +445,7 @@ class ProductTemplate(models.Model):
         }
         found_names = set()
         deps_map = {}
+        to_create = []
 
         for line in stdout.strip().splitlines():
             line = line.strip()
@@ -303,7 +482,9 @@ class ProductTemplate(models.Model):
                     'saas_type': 'module',
                     'type': 'service',
                 })
-                ProductTemplate.create(vals)
+                to_create.append(vals)
+        if to_create:
+            ProductTemplate.create(to_create)
 
         # Remove modules from this repo that no longer exist
         to_remove = ProductTemplate.search([
@@ -326,14 +507,7 @@ class ProductTemplate(models.Model):
             m.technical_name: m
             for m in version.module_ids
         }
-        for tech_name, dep_names in deps_map.items():
-            if tech_name not in all_version_modules:
-                continue
-            dep_records = ProductTemplate.browse()
-            for dep_name in dep_names:
-                if dep_name in all_version_modules:
-                    dep_records |= all_version_modules[dep_name]
-            all_version_modules[tech_name].saas_dependency_ids = dep_records
+        ProductTemplate._set_saas_dependencies(deps_map, all_version_modules)
 
         # Fetch icons for new modules
         self._fetch_repo_module_icons(server, image, volume_args, addons_path)
@@ -354,7 +528,11 @@ class ProductTemplate(models.Model):
     def _fetch_repo_module_icons(self, server, image, volume_args, addons_path):
         """Fetch icons for modules in this repo that don't have one yet."""
         self.ensure_one()
-        modules = self.saas_module_ids.filtered(lambda m: not m.image_1920)
+        # Filter in SQL rather than loading every stored icon to test it
+        modules = self.search([
+            ('id', 'in', self.saas_module_ids.ids),
+            ('image_1920', '=', False),
+        ])
         if not modules:
             return
 
@@ -1,7 +1,14 @@
-import shlex
+import csv
+import io
 
-from odoo import fields, models, _
-from odoo.exceptions import UserError
+from odoo import api, fields, models, _
+
+# Columns loaded by _copy_create, in CSV order
+_COPY_COLUMNS = (
+    'server_id', 'container_id', 'name', 'image', 'command',
+    'created', 'status', 'ports',
+    'create_uid', 'create_date', 'write_uid', 'write_date',
+)
 
 
 class SaasDockerContainer(models.Model):
@@ -52,33 +59,58 @@ class SaasDockerContainer(models.Model):
         help='Port mappings between the host and the container.',
     )
 
+    @api.model
+    def _copy_create(self, vals_list):
+        """Insert container rows with a single ``COPY FROM STDIN``.
+
+        Container records are plain snapshots of ``docker ps`` output with no
+        computed fields, constraints or overrides of ``create``, so the ORM
+        ``create`` is bypassed in favour of PostgreSQL's bulk loader. Each
+        dict must hold ``server_id`` and the container fields.
+        """
+        if not vals_list:
+            return
+        now = fields.Datetime.now()
+        uid = self.env.uid
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for vals in vals_list:
+            writer.writerow([
+                vals['server_id'], vals.get('container_id') or '', vals.get('name') or '',
+                vals.get('image') or '', vals.get('command') or '',
+                vals.get('created') or '', vals.get('status') or '', vals.get('ports') or '',
+                uid, now, uid, now,
+            ])
+        buf.seek(0)
+        self.flush_model()
+        self.env.cr.copy_expert(
+            'COPY %s (%s) FROM STDIN WITH CSV' % (self._table, ', '.join(_COPY_COLUMNS)),
+            buf,
+        )
+        self.invalidate_model()
+        self.env['saas.container.physical.server'].invalidate_model(['docker_container_ids'])
+
+    def _run_docker_command_per_server(self, verb, error_message):
+        """Run ``docker <verb>`` once per server with all selected container names.
+
+        The container lists of the affected servers are refreshed once at the end.
+        """
+        servers = self.mapped('server_id')
+        for server, containers in self.grouped('server_id').items():
+            server._run_docker_command(verb, containers.mapped('name'), error_message)
+        return servers.action_refresh_containers()
+
     def action_stop_container(self):
-        """Stop this Docker container via SSH."""
-        self.ensure_one()
-        server = self.server_id
-        with server._get_ssh_connection() as ssh:
-            exit_code, stdout, stderr = ssh.execute(
-                'docker stop %s' % shlex.quote(self.name),
-            )
-            if exit_code != 0:
-                raise UserError(
-                    _("Failed to stop container '%s':\n%s") % (self.name, stderr)
-                )
-        return server.action_refresh_containers()
+        """Stop the selected Docker containers via SSH."""
+        return self._run_docker_command_per_server(
+            'stop', _("Failed to stop container '%s':\n%s"),
+        )
 
     def action_restart_container(self):
-        """Restart this Docker container via SSH."""
-        self.ensure_one()
-        server = self.server_id
-        with server._get_ssh_connection() as ssh:
-            exit_code, stdout, stderr = ssh.execute(
-                'docker restart %s' % shlex.quote(self.name),
-            )
-            if exit_code != 0:
-                raise UserError(
-                    _("Failed to restart container '%s':\n%s") % (self.name, stderr)
-                )
-        return server.action_refresh_containers()
+        """Restart the selected Docker containers via SSH."""
+        return self._run_docker_command_per_server(
+            'restart', _("Failed to restart container '%s':\n%s"),
+        )
 
     def action_view_logs(self):
         """Open a live log stream for this container."""
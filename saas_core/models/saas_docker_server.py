@@ -1,15 +1,49 @@
+import logging
 import shlex
+from collections import defaultdict
 
 from odoo import fields, models, _
 from odoo.exceptions import UserError, ValidationError
 
-from ..utils import SSHConnection
+from ..utils import SSHCommandError, json_loads, run_parallel
+
+_logger = logging.getLogger(__name__)
+
+_DOCKER_PS_CMD = "docker ps -a --format '{{json .}}' --no-trunc"
+
+
+def _docker_container_vals(row):
+    """Map one ``docker ps --format '{{json .}}'`` object to container values."""
+    return {
+        'image': row.get('Image', ''),
+        'command': row.get('Command', ''),
+        'created': row.get('CreatedAt', ''),
+        'status': row.get('Status', ''),
+        'ports': row.get('Ports', ''),
+        'name': row.get('Names', ''),
+    }
+
+
+def _parse_docker_ps(lines):
+    """Parse ``docker ps --format '{{json .}}'`` output lines.
+
+    Returns:
+        dict: short (12 chars) container ID -> container values.
+    """
+    parsed = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        row = json_loads(line)
+        if row.get('ID'):
+            parsed[row['ID'][:12]] = _docker_container_vals(row)
+    return parsed
 
 
 class SaasContainerPhysicalServer(models.Model):
     _name = 'saas.container.physical.server'
     _description = 'Docker Host Server'
-    _inherit = ['mail.thread']
+    _inherit = ['mail.thread', 'saas.server.ssh.mixin']
     _order = 'sequence, name'
 
     sequence = fields.Integer(
@@ -23,40 +57,6 @@ class SaasContainerPhysicalServer(models.Model):
         tracking=True,
         help='Human-readable label for this Docker host server (e.g. "EU Production 1").',
     )
-    ssh_key_pair_id = fields.Many2one(
-        'saas.ssh.key.pair',
-        string='SSH Key Pair',
-        help='SSH key used to authenticate when connecting to this server.',
-    )
-    ssh_user = fields.Char(
-        string='SSH User',
-        default='root',
-        help='Operating system user for the SSH connection (e.g. root, ubuntu).',
-    )
-    ssh_port = fields.Integer(
-        string='SSH Port',
-        default=22,
-        help='TCP port on which the SSH daemon listens.',
-    )
-    ip_v4 = fields.Char(
-        string='Public IPv4',
-        help='Public IPv4 address of this server, reachable from the internet.',
-    )
-    private_ip_v4 = fields.Char(
-        string='Private IPv4',
-        help='Private / internal IPv4 address used for communication '
-             'between servers on the same network.',
-    )
-    ssh_connect_using = fields.Selection(
-        selection=[
-            ('public_ip', 'Public IP'),
-            ('private_ip', 'Private IP'),
-        ],
-        string='Connect via',
-        default='public_ip',
-        required=True,
-        help='Which IP address the SaaS manager should use when opening SSH sessions.',
-    )
     docker_base_path = fields.Char(
         string='Docker Base Path',
         default='/home/odoo',
@@ -69,90 +69,83 @@ class SaasContainerPhysicalServer(models.Model):
         string='Docker Containers',
         help='Containers currently running on this server (populated via Refresh).',
     )
+    container_refresh_pending = fields.Boolean(
+        string='Container Refresh Queued',
+        copy=False,
+        readonly=True,
+        help='Set when a background container refresh has been requested and '
+             'not yet processed.',
+    )
 
-    def _get_ssh_ip(self):
-        """Return the IP to use for SSH based on ssh_connect_using."""
-        self.ensure_one()
-        if self.ssh_connect_using == 'private_ip':
-            if not self.private_ip_v4:
-                raise ValidationError(
-                    _("Private IP address is required on server '%s' when SSH is set to use Private IP.")
-                    % self.name
-                )
-            return self.private_ip_v4
-        if not self.ip_v4:
-            raise ValidationError(
-                _("Public IP address is required on server '%s'.") % self.name
-            )
-        return self.ip_v4
+    def _get_docker_ps_command(self):
+        """Return the ``docker ps`` command used to list containers (one JSON object per line)."""
+        return _DOCKER_PS_CMD
 
-    def _get_ssh_connection(self):
-        """Return an SSHConnection context manager for this server."""
+    def _run_docker_command(self, verb, names, error_message):
+        """Run ``docker <verb>`` on this server for all container ``names`` at once.
+
+        ``docker stop`` / ``docker restart`` accept several containers, so the
+        whole batch costs a single SSH session and a single command.
+        """
         self.ensure_one()
-        if not self.ssh_key_pair_id or not self.ssh_key_pair_id.private_key_file:
-            raise ValidationError(
-                _("SSH key pair with a private key file is required on server '%s'.")
-                % self.name
-            )
-        ssh_ip = self._get_ssh_ip()
-        return SSHConnection(
-            host=ssh_ip,
-            port=self.ssh_port or 22,
-            user=self.ssh_user or 'root',
-            private_key_b64=self.ssh_key_pair_id.private_key_file,
-            key_type=self.ssh_key_pair_id.type or 'rsa',
-        )
-
-    def action_test_connection(self):
-        """Test SSH connection to the server."""
-        self.ensure_one()
-        try:
-            ssh_ip = self._get_ssh_ip()
-            with self._get_ssh_connection() as ssh:
-                exit_code, stdout, stderr = ssh.execute(
-                    'echo "Connection OK" && hostname'
-                )
-            if exit_code == 0:
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _("Connection Successful"),
-                        'message': _(
-                            "SSH connection to %s succeeded. Hostname: %s"
-                        ) % (ssh_ip, stdout.strip()),
-                        'type': 'success',
-                        'sticky': False,
-                    },
-                }
-            else:
-                raise UserError(
-                    _("Connection test command failed:\n%s") % stderr
-                )
-        except (UserError, ValidationError):
-            raise
-        except Exception as e:
-            raise UserError(
-                _("SSH connection failed:\n%s") % str(e)
+        with self._get_ssh_connection() as ssh:
+            exit_code, stdout, stderr = ssh.execute(
+                'docker %s %s' % (verb, ' '.join(shlex.quote(n) for n in names)),
             )
+            if exit_code != 0:
+                raise UserError(error_message % (', '.join(names), stderr))
+
+    def _sync_docker_containers(self, parsed_by_server):
+        """Update the container lists of these servers from parsed ``docker ps`` output.
+
+        Rows are matched on the container ID: unchanged containers are left
+        untouched, changed ones are written, new ones are bulk-loaded with one
+        ``COPY`` and containers that no longer exist are removed. The work for
+        all servers is batched together.
+
+        Args:
+            parsed_by_server: dict server record -> result of ``_parse_docker_ps``
+        """
+        Container = self.env['saas.docker.container']
+        existing = {
+            (c.server_id.id, c.container_id): c
+            for c in Container.search([('server_id', 'in', self.ids)])
+        }
+        to_create = []
+        to_write = defaultdict(lambda: Container)
+        for server, parsed in parsed_by_server.items():
+            for container_id, vals in parsed.items():
+                container = existing.pop((server.id, container_id), None)
+                if container is None:
+                    to_create.append(dict(vals, server_id=server.id, container_id=container_id))
+                    continue
+                changed = tuple(sorted(
+                    (fname, value) for fname, value in vals.items()
+                    if (container[fname] or '') != value
+                ))
+                if changed:
+                    to_write[changed] |= container
+
+        if existing:
+            Container.concat(*existing.values()).unlink()
+        for changed, containers in to_write.items():
+            containers.write(dict(changed))
+        Container._copy_create(to_create)
 
     def action_refresh_containers(self):
         """Fetch all Docker containers from the server via SSH and update the list."""
+        if len(self) > 1:
+            return self._refresh_containers_many()
         self.ensure_one()
-        separator = '|||'
-        fmt = separator.join([
-            '{{.ID}}', '{{.Image}}', '{{.Command}}',
-            '{{.CreatedAt}}', '{{.Status}}', '{{.Ports}}', '{{.Names}}',
-        ])
-        cmd = "docker ps -a --format '%s' --no-trunc" % fmt
+        cmd = self._get_docker_ps_command()
 
         try:
             with self._get_ssh_connection() as ssh:
-                exit_code, stdout, stderr = ssh.execute(cmd)
-                if exit_code != 0:
-                    raise UserError(
-                        _("Failed to list containers:\n%s") % stderr
-                    )
+                parsed = _parse_docker_ps(ssh.execute_iter(cmd))
+        except SSHCommandError as e:
+            raise UserError(
+                _("Failed to list containers:\n%s") % e.stderr
+            )
         except (UserError, ValidationError):
             raise
         except Exception as e:
@@ -160,23 +153,78 @@ class SaasContainerPhysicalServer(models.Model):
                 _("SSH connection failed:\n%s") % str(e)
             )
 
-        self.docker_container_ids.unlink()
-
-        container_model = self.env['saas.docker.container']
-        for line in stdout.strip().splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split(separator)
-            if len(parts) < 7:
-                continue
-            container_model.create({
-                'server_id': self.id,
-                'container_id': parts[0][:12],
-                'image': parts[1],
-                'command': parts[2],
-                'created': parts[3],
-                'status': parts[4],
-                'ports': parts[5],
-                'name': parts[6],
-            })
+        self._sync_docker_containers({self: parsed})
+
+    def _refresh_containers_many(self):
+        """Refresh containers of several servers, fetching over SSH concurrently.
+
+        Servers that fail are reported in a warning notification; the others
+        are still updated.
+        """
+        cmd = self._get_docker_ps_command()
+        connections = [server._get_ssh_connection() for server in self]
+
+        def fetch(conn):
+            with conn as ssh:
+                return _parse_docker_ps(ssh.execute_iter(cmd))
+
+        errors = []
+        parsed_by_server = {}
+        for server, (parsed, error) in zip(self, run_parallel(fetch, connections)):
+            if isinstance(error, SSHCommandError):
+                errors.append(
+                    _("%s: failed to list containers: %s") % (server.name, error.stderr)
+                )
+            elif error is not None:
+                errors.append(_("%s: SSH connection failed: %s") % (server.name, error))
+            else:
+                parsed_by_server[server] = parsed
+        self.browse().concat(*parsed_by_server)._sync_docker_containers(parsed_by_server)
+        if not errors:
+            return True
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Some Servers Could Not Be Refreshed"),
+                'message': '\n'.join(errors),
+                'type': 'warning',
+                'sticky': True,
+            },
+        }
+
+    def action_refresh_containers_async(self):
+        """Queue a container refresh of these servers instead of running it now.
+
+        Uses queue_job when it is installed, otherwise flags the servers and
+        triggers the container refresh cron.
+        """
+        if hasattr(self, 'with_delay'):
+            self.with_delay().action_refresh_containers()
+        else:
+            self.write({'container_refresh_pending': True})
+            self.env.ref('saas_core.ir_cron_saas_container_refresh')._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Refresh Queued"),
+                'message': _("Containers of %d server(s) will be refreshed in the background.")
+                % len(self),
+                'type': 'info',
+                'sticky': False,
+            },
+        }
+
+    def _cron_refresh_containers(self):
+        """Cron: refresh the containers of servers queued for a background refresh."""
+        servers = self.search([('container_refresh_pending', '=', True)])
+        if not servers:
+            return
+        servers.write({'container_refresh_pending': False})
+        result = servers._refresh_containers_many()
+        if isinstance(result, dict):
+            _logger.warning(
+                "Background container refresh failed for some servers:\n%s",
+                result['params']['message'],
+            )
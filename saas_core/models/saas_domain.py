@@ -8,7 +8,6 @@ class SaasBasedDomain(models.Model):
     name = fields.Char(
         string='Domain Name',
         required=True,
-        tracking=True,
         help='The parent domain under which instance subdomains are created '
              '(e.g. "saas.example.com"). Instances will be reachable at '
              '<subdomain>.<domain>.',
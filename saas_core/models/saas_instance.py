@@ -1,16 +1,20 @@
-import datetime
+import functools
 import logging
 import os
 import re
 import secrets
 import shlex
 import string
+import time
+from contextlib import contextmanager, nullcontext
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..utils import git_pull_command, run_parallel
+
 _logger = logging.getLogger(__name__)
 
 TEMPLATES_PATH = os.path.join(
@@ -18,13 +22,102 @@ TEMPLATES_PATH = os.path.join(
     'templates',
 )
 
+
+def _jinja_bytecode_cache():
+    """Return a bytecode cache shared by workers, or None if unavailable.
+
+    Without a directory, Jinja uses a per-user cache directory (mode 0700)
+    under the system temp dir and refuses one owned by someone else.
+    """
+    try:
+        return FileSystemBytecodeCache(pattern='__saas_jinja2_%s.cache')
+    except Exception:
+        _logger.warning("Jinja bytecode cache unavailable", exc_info=True)
+        return None
+
+
+# Templates ship with the module and only change on upgrade (which restarts
+# the workers), so skip the per-render mtime check. Compiled templates are
+# also cached on disk so new workers don't recompile them.
 _JINJA_ENV = Environment(
     loader=FileSystemLoader(TEMPLATES_PATH),
     keep_trailing_newline=True,
+    auto_reload=False,
+    bytecode_cache=_jinja_bytecode_cache(),
 )
 
 SUBDOMAIN_RE = re.compile(r'^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$')
 DB_USER_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+_DB_USER_TABLE = str.maketrans('-.', '__')
+_NON_WORD_RE = re.compile(r'\W+')  # anything but str.isalnum() characters and '_'
+# One 'key = value' line of extra_config; '#' comments and lines without '='
+# never match. Surrounding whitespace is dropped as str.strip() would.
+_EXTRA_CONFIG_RE = re.compile(
+    r'^[^\S\n]*([^\s#=][^=\n]*?)?[^\S\n]*=[^\S\n]*(.*?)[^\S\n]*$', re.MULTILINE,
+)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_extra_config_text(text):
+    """Return the (key, value) pairs of an extra_config text, as a tuple."""
+    return tuple(_EXTRA_CONFIG_RE.findall(text))
+
+
+# Instances deployed concurrently by one action_deploy() call, each in its
+# own thread and cursor.
+_DEPLOY_MAX_PARALLEL = 4
+# Namespace of the advisory lock serializing port assignment per Docker
+# server (the second key is the server id), across threads and workers.
+_PORTS_LOCK_NAMESPACE = 0x5AA5
+
+_PASSWORD_ALPHABET = string.ascii_letters + string.digits + '-_.~+='
+# Largest multiple of the alphabet size below 256: bytes above it are
+# rejected so that ``byte % size`` is unbiased.
+_PASSWORD_BYTE_LIMIT = 256 - 256 % len(_PASSWORD_ALPHABET)
+
+# Wait up to 60s for a container to be running. The current state is checked
+# first; otherwise the first start/die event is awaited (replayed from just
+# before the check, so none is missed) instead of polling docker inspect.
+_CONTAINER_WAIT_SCRIPT = (
+    'SINCE=$(date +%%s); '
+    'STATUS=$(docker inspect -f "{{.State.Status}}" %(name)s 2>/dev/null); '
+    'case "$STATUS" in '
+    '  running) echo READY; exit 0;; '
+    '  exited|dead) echo "FAILED:$STATUS"; exit 1;; '
+    'esac; '
+    'exec 3< <(timeout 60 docker events --since "$SINCE" --filter container=%(name)s '
+    '  --filter event=start --filter event=die --format "{{.Action}}" 2>/dev/null </dev/null); '
+    'EVENTS_PID=$!; '
+    'read -r EVENT <&3; '
+    'kill "$EVENTS_PID" 2>/dev/null; '
+    'case "$EVENT" in '
+    '  start) echo READY; exit 0;; '
+    '  die) echo "FAILED:die"; exit 1;; '
+    'esac; '
+    'echo TIMEOUT; exit 1'
+)
+
+
+# Role (created, or password reset) and database in one psql run; \gexec
+# executes the generated statement, so CREATE DATABASE runs outside any
+# transaction block. The literals are filled in by _provision_postgresql().
+_PSQL_PROVISION_SQL = (
+    "SELECT format(CASE WHEN EXISTS (SELECT FROM pg_roles WHERE rolname = %(user_lit)s)\n"
+    "    THEN 'ALTER ROLE %%I WITH LOGIN PASSWORD %%L'\n"
+    "    ELSE 'CREATE ROLE %%I WITH LOGIN PASSWORD %%L' END,\n"
+    "    %(user_lit)s, %(pass_lit)s)\\gexec\n"
+    "SELECT format('CREATE DATABASE %%I OWNER %%I', %(db_lit)s, %(user_lit)s)\n"
+    "WHERE NOT EXISTS (SELECT FROM pg_database WHERE datname = %(db_lit)s)\\gexec\n"
+)
+
+
+# Drop the instance database and role if they exist, in one psql run.
+_PSQL_DROP_SQL = (
+    "SELECT format('DROP DATABASE %%I', datname) FROM pg_database\n"
+    "WHERE datname = %(db_lit)s\\gexec\n"
+    "SELECT format('DROP ROLE %%I', rolname) FROM pg_roles\n"
+    "WHERE rolname = %(user_lit)s\\gexec\n"
+)
 
 
 class SaasInstance(models.Model):
@@ -51,6 +144,9 @@ class SaasInstance(models.Model):
         string='Instance Name',
         compute='_compute_name',
         store=True,
+        precompute=True,
+        compute_sudo=True,
+        index=True,
         help='Full hostname of the instance, computed from subdomain and base domain.',
     )
     partner_id = fields.Many2one(
@@ -62,7 +158,6 @@ class SaasInstance(models.Model):
     url = fields.Char(
         string='URL',
         compute='_compute_url',
-        store=True,
         help='Public HTTPS URL to access this instance.',
     )
 
@@ -95,16 +190,26 @@ class SaasInstance(models.Model):
         default=lambda self: self.env['saas.psql.physical.server'].search([], limit=1),
         help='PostgreSQL server that hosts the database for this instance.',
     )
-    xmlrpc_port = fields.Char(
+    xmlrpc_port = fields.Integer(
         string='HTTP Port',
         readonly=True,
         help='Host port mapped to the Odoo XML-RPC / HTTP interface inside the container.',
     )
-    longpolling_port = fields.Char(
+    longpolling_port = fields.Integer(
         string='Longpolling Port',
         readonly=True,
         help='Host port mapped to the Odoo longpolling / websocket interface inside the container.',
     )
+    partner_code = fields.Char(
+        compute='_compute_partner_code',
+        store=True,
+        help='Folder name of the customer on the Docker server: partnercode_partnername.',
+    )
+    instance_path = fields.Char(
+        compute='_compute_instance_path',
+        store=True,
+        help='Full remote path of this instance on the Docker server.',
+    )
 
     # ========== Credentials ==========
     admin_password = fields.Char(
@@ -253,7 +358,7 @@ class SaasInstance(models.Model):
     company_id = fields.Many2one(
         'res.company',
         string='Company',
-        default=lambda self: self.env.company,
+        default=lambda self: self.env.company.id,
         help='Company that manages this SaaS instance.',
     )
 
@@ -290,14 +395,18 @@ class SaasInstance(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
+        # Generate credentials up front so they are part of the INSERT.
+        # Invalid subdomains are left to _check_subdomain_format to report.
+        for vals in vals_list:
+            subdomain = vals.get('subdomain')
+            if not vals.get('db_user') and subdomain and SUBDOMAIN_RE.match(subdomain):
+                vals['db_user'] = self._generate_db_user(subdomain)
+            if not vals.get('db_password'):
+                vals['db_password'] = self._generate_random_password()
+            if not vals.get('admin_password'):
+                vals['admin_password'] = self._generate_random_password()
         records = super().create(vals_list)
         for rec in records:
-            if not rec.db_user and rec.subdomain:
-                rec.db_user = rec._generate_db_user()
-            if not rec.db_password:
-                rec.db_password = rec._generate_random_password()
-            if not rec.admin_password:
-                rec.admin_password = rec._generate_random_password()
             if rec.docker_server_id and (not rec.xmlrpc_port or not rec.longpolling_port):
                 rec._auto_assign_ports()
         return records
@@ -311,13 +420,29 @@ class SaasInstance(models.Model):
             else:
                 rec.name = rec.subdomain or ''
 
-    @api.depends('subdomain', 'domain_id.name')
+    @api.depends('name', 'domain_id')
     def _compute_url(self):
         for rec in self:
-            if rec.subdomain and rec.domain_id:
-                rec.url = 'https://%s.%s' % (rec.subdomain, rec.domain_id.name)
+            rec.url = 'https://%s' % rec.name if rec.name and rec.domain_id else ''
+
+    @api.depends('partner_id.ref', 'partner_id.name')
+    def _compute_partner_code(self):
+        for rec in self:
+            partner = rec.partner_id
+            code = partner.ref or str(partner.id)
+            safe_name = _NON_WORD_RE.sub('', (partner.name or '').strip().lower().replace(' ', '_'))
+            rec.partner_code = '%s_%s' % (code, safe_name)
+
+    @api.depends('docker_server_id.docker_base_path', 'partner_code', 'subdomain')
+    def _compute_instance_path(self):
+        for rec in self:
+            base_path = rec.docker_server_id.docker_base_path
+            if base_path:
+                rec.instance_path = '%s/%s/%s' % (
+                    base_path.rstrip('/'), rec.partner_code, rec.subdomain,
+                )
             else:
-                rec.url = ''
+                rec.instance_path = False
 
     @api.depends('backup_ids')
     def _compute_backup_count(self):
@@ -333,40 +458,44 @@ class SaasInstance(models.Model):
     # ========== Private Helpers ==========
 
     def _generate_random_password(self, length=24):
-        """Generate a cryptographically secure random password."""
-        alphabet = string.ascii_letters + string.digits + '-_.~+='
-        return ''.join(secrets.choice(alphabet) for _ in range(length))
+        """Generate a cryptographically secure random password.
 
-    def _generate_db_user(self):
-        """Generate a db username based on subdomain."""
-        self.ensure_one()
-        safe_subdomain = self.subdomain.replace('-', '_').replace('.', '_')
+        Random bytes are drawn in bulk and mapped onto the alphabet with
+        rejection sampling, so each character stays uniformly distributed.
+        """
+        size = len(_PASSWORD_ALPHABET)
+        chars = []
+        while len(chars) < length:
+            chars.extend(
+                _PASSWORD_ALPHABET[b % size]
+                for b in secrets.token_bytes(length * 2)
+                if b < _PASSWORD_BYTE_LIMIT
+            )
+        return ''.join(chars[:length])
+
+    def _generate_db_user(self, subdomain=None):
+        """Generate a db username based on subdomain (defaults to the record's)."""
+        if subdomain is None:
+            self.ensure_one()
+            subdomain = self.subdomain
+        safe_subdomain = subdomain.translate(_DB_USER_TABLE)
         db_user = 'saas_%s' % safe_subdomain
         if not DB_USER_RE.match(db_user):
             raise ValidationError(
                 _("Cannot generate a safe database username from subdomain '%s'.")
-                % self.subdomain
+                % subdomain
             )
         return db_user
 
     def _get_partner_code(self):
         """Return partner code for folder naming: partnercode_partnername."""
         self.ensure_one()
-        code = self.partner_id.ref or str(self.partner_id.id)
-        name = self.partner_id.name or ''
-        safe_name = name.strip().lower().replace(' ', '_')
-        safe_name = ''.join(c for c in safe_name if c.isalnum() or c == '_')
-        return '%s_%s' % (code, safe_name)
+        return self.partner_code
 
     def _get_instance_path(self):
         """Return the full remote path for this instance."""
         self.ensure_one()
-        server = self.docker_server_id
-        return '%s/%s/%s' % (
-            server.docker_base_path.rstrip('/'),
-            self._get_partner_code(),
-            self.subdomain,
-        )
+        return self.instance_path
 
     def _get_container_name(self):
         """Return the Docker container name for this instance."""
@@ -374,12 +503,35 @@ class SaasInstance(models.Model):
         return 'odoo_%s' % self.subdomain
 
     def _append_log(self, message):
-        """Append a timestamped message to provisioning_log."""
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        """Append a timestamped message to provisioning_log.
+
+        Inside :meth:`_buffered_log` the line is only collected in memory.
+        """
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
         line = '[%s] %s\n' % (timestamp, message)
+        buffers = self.env.context.get('saas_log_buffers')
+        if buffers is not None and self.id in buffers:
+            buffers[self.id].append(line)
+            return
         current = self.provisioning_log or ''
         self.provisioning_log = current + line
 
+    @contextmanager
+    def _buffered_log(self):
+        """Collect the log lines of this instance and write them once on exit.
+
+        Yields the instance with a context in which :meth:`_append_log`
+        buffers instead of rewriting the whole log field on every line.
+        """
+        self.ensure_one()
+        buffers = dict(self.env.context.get('saas_log_buffers') or {})
+        lines = buffers[self.id] = []
+        try:
+            yield self.with_context(saas_log_buffers=buffers)
+        finally:
+            if lines:
+                self.provisioning_log = (self.provisioning_log or '') + ''.join(lines)
+
     def _render_template(self, template_name, context):
         """Render a Jinja2 template from the templates/ directory."""
         template = _JINJA_ENV.get_template(template_name)
@@ -438,17 +590,17 @@ class SaasInstance(models.Model):
     def _parse_extra_config(self):
         """Parse the extra_config text field into a dict."""
         self.ensure_one()
-        result = {}
-        if self.extra_config:
-            for line in self.extra_config.strip().splitlines():
-                line = line.strip()
-                if '=' in line and not line.startswith('#'):
-                    key, _, value = line.partition('=')
-                    result[key.strip()] = value.strip()
-        return result or None
-
-    def _provision_postgresql(self):
-        """Create the PostgreSQL role and database on the database server via SSH."""
+        if not self.extra_config:
+            return None
+        return dict(_parse_extra_config_text(self.extra_config)) or None
+
+    def _provision_postgresql(self, ssh=None):
+        """Create the PostgreSQL role and database on the database server via SSH.
+
+        ``ssh`` is an already open connection that is reused when it reaches
+        the database server too (both roles on one host), instead of opening
+        a second session.
+        """
         self.ensure_one()
         psql_server = self.db_server_id
         if not psql_server:
@@ -467,52 +619,35 @@ class SaasInstance(models.Model):
                 _("Subdomain '%s' contains unsafe characters for a database name.") % db_name
             )
 
-        sql_script = (
-            "DO $body$\n"
-            "BEGIN\n"
-            "  IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = %(user_lit)s) THEN\n"
-            "    EXECUTE format('CREATE ROLE %%I WITH LOGIN PASSWORD %%L', %(user_lit)s, %(pass_lit)s);\n"
-            "  ELSE\n"
-            "    EXECUTE format('ALTER ROLE %%I WITH LOGIN PASSWORD %%L', %(user_lit)s, %(pass_lit)s);\n"
-            "  END IF;\n"
-            "END $body$;\n"
-        ) % {
-            'user_lit': "$$%s$$" % db_user,
-            'pass_lit': "$$%s$$" % db_password.replace("$$", "$ $"),
+        # Literals are dollar-quoted with a random tag, so no value needs
+        # escaping and the password is never altered.
+        tag = '$saas_%s$' % secrets.token_hex(8)
+        sql_script = _PSQL_PROVISION_SQL % {
+            'user_lit': '%s%s%s' % (tag, db_user, tag),
+            'pass_lit': '%s%s%s' % (tag, db_password, tag),
+            'db_lit': '%s%s%s' % (tag, db_name, tag),
         }
+        delimiter = 'SAAS_END_%s' % secrets.token_hex(8)
+        provision_cmd = "sudo -u postgres psql -v ON_ERROR_STOP=1 <<'%s'\n%s%s" % (
+            delimiter, sql_script, delimiter,
+        )
 
-        ensure_role_cmd = "sudo -u postgres psql <<'SAAS_END_SQL'\n%s\nSAAS_END_SQL" % sql_script
-
-        create_db_cmd = (
-            "sudo -u postgres psql -tc "
-            "\"SELECT 1 FROM pg_database WHERE datname='%(db)s'\" "
-            "| grep -q 1 "
-            "|| sudo -u postgres createdb -O %(user)s %(db)s"
-        ) % {'db': db_name, 'user': db_user}
-
-        with psql_server._get_ssh_connection() as ssh:
-            self._append_log("Ensuring PostgreSQL role '%s'..." % db_user)
-            exit_code, stdout, stderr = ssh.execute(ensure_role_cmd)
+        connection = psql_server._get_ssh_connection()
+        if ssh is not None and ssh.same_target(connection):
+            connection = nullcontext(ssh)
+        with connection as ssh:
             self._append_log(
-                "Role command result: exit=%s stdout=%s stderr=%s"
-                % (exit_code, stdout.strip(), stderr.strip())
+                "Ensuring PostgreSQL role '%s' and database '%s'..." % (db_user, db_name)
             )
-            if exit_code != 0:
-                raise UserError(
-                    _("Failed to create/update PostgreSQL role '%s':\n%s")
-                    % (db_user, stderr)
-                )
-
-            self._append_log("Ensuring database '%s'..." % db_name)
-            exit_code, stdout, stderr = ssh.execute(create_db_cmd)
+            exit_code, stdout, stderr = ssh.execute(provision_cmd)
             self._append_log(
-                "DB command result: exit=%s stdout=%s stderr=%s"
+                "PostgreSQL command result: exit=%s stdout=%s stderr=%s"
                 % (exit_code, stdout.strip(), stderr.strip())
             )
             if exit_code != 0:
                 raise UserError(
-                    _("Failed to create database '%s':\n%s")
-                    % (db_name, stderr)
+                    _("Failed to create/update PostgreSQL role '%s' and database '%s':\n%s")
+                    % (db_user, db_name, stderr)
                 )
 
     def _ensure_can_ssh(self):
@@ -528,6 +663,13 @@ class SaasInstance(models.Model):
             )
         server._get_ssh_ip()
 
+    def _run_docker_command_per_server(self, verb, error_message):
+        """Run ``docker <verb>`` once per Docker server on the instances' containers."""
+        for server, instances in self.grouped('docker_server_id').items():
+            server._run_docker_command(
+                verb, [rec._get_container_name() for rec in instances], error_message,
+            )
+
     def _auto_assign_ports(self):
         """Auto-assign xmlrpc_port and longpolling_port if not already set."""
         self.ensure_one()
@@ -538,39 +680,44 @@ class SaasInstance(models.Model):
             'saas_master.default_instance_starting_port', '32000',
         ))
 
-        siblings = self.env['saas.instance'].search([
-            ('docker_server_id', '=', self.docker_server_id.id),
-            ('id', '!=', self.id),
-            ('xmlrpc_port', '!=', False),
-        ])
-
-        used_ports = set()
-        for sibling in siblings:
-            if sibling.xmlrpc_port:
-                try:
-                    used_ports.add(int(sibling.xmlrpc_port))
-                except (ValueError, TypeError):
-                    pass
-            if sibling.longpolling_port:
-                try:
-                    used_ports.add(int(sibling.longpolling_port))
-                except (ValueError, TypeError):
-                    pass
-
-        candidate = starting_port
-        while candidate < 65535:
-            if candidate not in used_ports and (candidate + 1) not in used_ports:
-                break
-            candidate += 2
+        # Held until the transaction ends, so the pair picked below is
+        # committed before anyone else on this server picks one.
+        self.env.cr.execute(
+            "SELECT pg_advisory_xact_lock(%s, %s)",
+            [_PORTS_LOCK_NAMESPACE, self.docker_server_id.id],
+        )
 
-        if candidate >= 65535:
+        # Each used port is mapped to the (candidate, candidate + 1) pair it
+        # falls in, and the first candidate without one is picked by a
+        # hashed NOT IN, so no port list comes back to Python.
+        self.flush_model(['docker_server_id', 'xmlrpc_port', 'longpolling_port'])
+        self.env.cr.execute("""
+            SELECT candidate FROM generate_series(%(start)s, 65534, 2) candidate
+             WHERE candidate NOT IN (
+                SELECT %(start)s + (port - %(start)s) / 2 * 2 FROM (
+                    SELECT xmlrpc_port AS port FROM saas_instance
+                     WHERE docker_server_id = %(server_id)s AND id != %(id)s
+                    UNION
+                    SELECT longpolling_port FROM saas_instance
+                     WHERE docker_server_id = %(server_id)s AND id != %(id)s
+                ) ports
+                WHERE port >= %(start)s
+             )
+             LIMIT 1
+        """, {'server_id': self.docker_server_id.id, 'id': self.id, 'start': starting_port})
+        row = self.env.cr.fetchone()
+
+        if not row:
             raise ValidationError(
                 _("No available port pair found on server '%s'.")
                 % self.docker_server_id.name
             )
 
-        self.xmlrpc_port = str(candidate)
-        self.longpolling_port = str(candidate + 1)
+        candidate = row[0]
+        self.write({
+            'xmlrpc_port': candidate,
+            'longpolling_port': candidate + 1,
+        })
 
     def _validate_deploy_fields(self):
         """Validate all required fields before deployment."""
@@ -695,14 +842,87 @@ class SaasInstance(models.Model):
     # ========== Deploy Flow ==========
 
     def action_deploy(self):
-        """Full deployment flow: provision Docker container over SSH."""
+        """Full deployment flow: provision Docker container over SSH.
+
+        Each instance is deployed in its own cursor committing its own
+        outcome (see :meth:`_deploy_in_new_cursor`), so a failed deployment
+        keeps its 'failed' state and log whether one or several instances
+        are deployed. Deploying is mostly waiting on SSH, so several
+        instances are deployed concurrently.
+        """
         for rec in self:
             if rec.state not in ('draft', 'failed'):
                 raise UserError(
                     _("Cannot deploy instance '%s': must be in Draft or Failed state (current: %s).")
                     % (rec.subdomain, rec.state)
                 )
-            rec._do_deploy()
+
+        self.env.flush_all()
+        results = run_parallel(
+            self._deploy_in_new_cursor, self.ids, max_workers=_DEPLOY_MAX_PARALLEL,
+        )
+        self.env.invalidate_all()
+
+        errors = []
+        for rec, (deployed, exc) in zip(self, results):
+            if exc is not None and len(self) == 1:
+                raise exc
+            if exc is not None:
+                message = exc.args[0] if isinstance(exc, UserError) else str(exc)
+                errors.append('%s: %s' % (rec.subdomain, message))
+            elif not deployed:
+                with rec._buffered_log() as buffered:
+                    buffered._do_deploy()
+        if errors:
+            raise UserError(
+                _("Deployment failed for %s instance(s):\n%s")
+                % (len(errors), '\n\n'.join(errors))
+            )
+
+    def _deploy_in_new_cursor(self, instance_id):
+        """Deploy one instance in a separate cursor; meant to run in a thread.
+
+        The ports are committed first, under the advisory lock taken by
+        :meth:`_auto_assign_ports`, so that concurrent deployments never
+        pick the same pair. The outcome (running, or failed with its log)
+        is committed even when the deployment fails.
+
+        Returns False without deploying when the instance is not visible to
+        a new transaction or is locked by the calling one (e.g. it was
+        created or modified in the same request); the caller deploys it
+        itself then.
+        """
+        context = dict(self.env.context)
+        context.pop('saas_log_buffers', None)
+        new_cr = self.pool.cursor()
+        try:
+            # The port query must see pairs committed while this transaction
+            # waited on the lock, which a repeatable read snapshot would not
+            new_cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            new_cr.execute(
+                "SELECT id FROM saas_instance WHERE id = %s FOR UPDATE SKIP LOCKED",
+                [instance_id],
+            )
+            if not new_cr.fetchone():
+                return False
+            new_env = api.Environment(new_cr, self.env.uid, context, su=self.env.su)
+            instance = new_env['saas.instance'].browse(instance_id)
+            instance._validate_deploy_fields()
+            instance._auto_assign_ports()
+            new_cr.commit()
+            try:
+                with instance._buffered_log() as buffered:
+                    buffered._do_deploy()
+            except Exception:
+                new_cr.commit()
+                raise
+            new_cr.commit()
+            return True
+        except Exception:
+            new_cr.rollback()
+            raise
+        finally:
+            new_cr.close()
 
     def _do_deploy(self):
         """Internal deploy logic for a single record."""
@@ -710,17 +930,16 @@ class SaasInstance(models.Model):
 
         self._validate_deploy_fields()
 
+        self._auto_assign_ports()
+
+        vals = {'provisioning_log': '', 'state': 'provisioning'}
         if not self.db_user:
-            self.db_user = self._generate_db_user()
+            vals['db_user'] = self._generate_db_user()
         if not self.db_password:
-            self.db_password = self._generate_random_password()
+            vals['db_password'] = self._generate_random_password()
         if not self.admin_password:
-            self.admin_password = self._generate_random_password()
-
-        self._auto_assign_ports()
-
-        self.provisioning_log = ''
-        self.state = 'provisioning'
+            vals['admin_password'] = self._generate_random_password()
+        self.write(vals)
 
         server = self.docker_server_id
         instance_path = self._get_instance_path()
@@ -729,35 +948,7 @@ class SaasInstance(models.Model):
         try:
             with server._get_ssh_connection() as ssh:
 
-                # Create folder structure
-                self._append_log("Creating directory structure at %s" % instance_path)
-                mkdir_cmd = (
-                    'mkdir -p %(path)s/addons '
-                    '%(path)s/config '
-                    '%(path)s/data/odoo'
-                ) % {'path': instance_path}
-                exit_code, stdout, stderr = ssh.execute(mkdir_cmd)
-                if exit_code != 0:
-                    raise UserError(
-                        _("Failed to create directories:\n%s") % stderr
-                    )
-                self._append_log("Directory structure created.")
-
-                # Set permissions
-                self._append_log("Setting permissions...")
-                perms_cmd = (
-                    'chown -R 1000:1000 %(path)s/data/odoo %(path)s/config %(path)s/addons && '
-                    'chmod -R 777 %(path)s/data/odoo %(path)s/config %(path)s/addons'
-                ) % {'path': instance_path}
-                exit_code, stdout, stderr = ssh.execute(perms_cmd)
-                if exit_code != 0:
-                    raise UserError(
-                        _("Failed to set permissions:\n%s") % stderr
-                    )
-                self._append_log("Permissions set.")
-
-                # Render and write docker-compose.yml
-                self._append_log("Writing docker-compose.yml...")
+                # Render docker-compose.yml and odoo.conf
                 repos, version_repos, all_addons_paths = self._get_all_repo_context()
                 dc_context = {
                     'odoo_image': self.odoo_version_id.docker_image,
@@ -775,13 +966,6 @@ class SaasInstance(models.Model):
                 dc_content = self._render_template(
                     'docker-compose.yml.jinja', dc_context,
                 )
-                ssh.write_file(
-                    '%s/docker-compose.yml' % instance_path, dc_content,
-                )
-                self._append_log("docker-compose.yml written.")
-
-                # Render and write odoo.conf
-                self._append_log("Writing odoo.conf...")
                 psql_server = self.db_server_id
                 db_host = psql_server.private_ip_v4 or psql_server.ip_v4
                 conf_context = {
@@ -797,14 +981,34 @@ class SaasInstance(models.Model):
                 conf_content = self._render_template(
                     'odoo.conf.jinja', conf_context,
                 )
-                ssh.write_file(
-                    '%s/config/odoo.conf' % instance_path, conf_content,
+
+                # Create folder structure and set permissions in one command,
+                # then upload both files over SFTP
+                self._append_log(
+                    "Creating directory structure at %s and writing "
+                    "docker-compose.yml and odoo.conf..." % instance_path
                 )
-                self._append_log("odoo.conf written.")
+                dirs = ' '.join(
+                    shlex.quote('%s/%s' % (instance_path, d))
+                    for d in ('data/odoo', 'config', 'addons')
+                )
+                exit_code, stdout, stderr = ssh.execute(
+                    'mkdir -p %(dirs)s && chown -R 1000:1000 %(dirs)s && '
+                    'chmod -R 777 %(dirs)s' % {'dirs': dirs}
+                )
+                if exit_code != 0:
+                    raise UserError(
+                        _("Failed to prepare the instance directory:\n%s") % stderr
+                    )
+                ssh.write_files({
+                    '%s/docker-compose.yml' % instance_path: dc_content,
+                    '%s/config/odoo.conf' % instance_path: conf_content,
+                })
+                self._append_log("Directory structure, permissions and config files ready.")
 
                 # Create PostgreSQL user and database
                 self._append_log("Creating PostgreSQL role and database...")
-                self._provision_postgresql()
+                self._provision_postgresql(ssh)
                 self._append_log("PostgreSQL role and database ready.")
 
                 # Collect all modules from pending lines (sequence order)
@@ -812,13 +1016,11 @@ class SaasInstance(models.Model):
                     lambda l: l.state == 'pending'
                 ).sorted('sequence')
 
-                all_module_names = []
-                for line in pending_lines:
-                    names = line._get_all_technical_names()
-                    names.discard('base')
-                    for n in sorted(names):
-                        if n not in all_module_names:
-                            all_module_names.append(n)
+                all_module_names = [
+                    n for n in self.env['product.template']._get_install_order(
+                        pending_lines._get_product_templates().ids
+                    ) if n != 'base'
+                ]
 
                 modules_to_install = 'base'
                 if all_module_names:
@@ -826,8 +1028,7 @@ class SaasInstance(models.Model):
 
                 # Log what each line contributes
                 for line in pending_lines:
-                    names = line._get_all_technical_names()
-                    names.discard('base')
+                    names = line._get_all_technical_names() - {'base'}
                     label = line.product_id.name if line.product_id else (
                         line.module_id.name if line.module_id else ','.join(sorted(names))
                     )
@@ -851,15 +1052,18 @@ class SaasInstance(models.Model):
                     shlex.quote(self.subdomain),
                     shlex.quote(modules_to_install),
                 )
-                exit_code, stdout, stderr = ssh.execute(init_cmd, timeout=600)
+                exit_code, stdout, stderr = ssh.execute(
+                    init_cmd, timeout=600, tail_bytes=4096,
+                )
                 self._append_log(
                     "Install output (last 1000 chars):\n%s"
                     % stdout[-1000:]
                 )
                 if exit_code != 0:
-                    for line in pending_lines:
-                        line.state = 'failed'
-                        line.log = stdout[-2000:] + '\n' + stderr[-500:]
+                    pending_lines.write({
+                        'state': 'failed',
+                        'log': stdout[-2000:] + '\n' + stderr[-500:],
+                    })
                     raise UserError(
                         _("Module installation failed:\n%s\n%s")
                         % (stdout[-500:], stderr[-500:])
@@ -867,17 +1071,16 @@ class SaasInstance(models.Model):
                 self._append_log("All modules installed successfully.")
 
                 # Mark all lines as installed and track products
+                pending_lines.write({'state': 'installed', 'log': ''})
                 all_products = self.env['product.product']
                 for line in pending_lines:
-                    line.state = 'installed'
-                    line.log = ''
                     if line.product_id:
                         module_tmpls = line.product_id.product_tmpl_id.saas_module_ids
                         all_products |= module_tmpls.mapped('product_variant_id')
                     elif line.module_id:
                         all_products |= line.module_id
                 if all_products:
-                    self.installed_module_ids = [(4, p.id) for p in all_products]
+                    self.installed_module_ids = [(4, pid) for pid in all_products.ids]
 
                 # Start the server
                 self._append_log("Starting container with docker compose up -d...")
@@ -894,17 +1097,9 @@ class SaasInstance(models.Model):
 
                 # Wait for container to be ready
                 self._append_log("Waiting for container to be ready...")
-                wait_cmd = (
-                    'for i in $(seq 1 30); do '
-                    '  STATUS=$(docker inspect -f "{{.State.Status}}" %s 2>/dev/null); '
-                    '  if [ "$STATUS" = "running" ]; then echo "READY"; exit 0; fi; '
-                    '  if [ "$STATUS" = "exited" ] || [ "$STATUS" = "dead" ]; then '
-                    '    echo "FAILED:$STATUS"; exit 1; '
-                    '  fi; '
-                    '  sleep 2; '
-                    'done; '
-                    'echo "TIMEOUT"; exit 1'
-                ) % shlex.quote(container_name)
+                wait_cmd = 'bash -c %s' % shlex.quote(
+                    _CONTAINER_WAIT_SCRIPT % {'name': shlex.quote(container_name)}
+                )
                 exit_code, stdout, stderr = ssh.execute(wait_cmd)
                 if exit_code != 0 or 'READY' not in stdout:
                     _ec, logs_out, _err = ssh.execute(
@@ -954,18 +1149,10 @@ class SaasInstance(models.Model):
                     % (rec.subdomain, rec.state)
                 )
             rec._ensure_can_ssh()
-            server = rec.docker_server_id
-            container_name = rec._get_container_name()
-            with server._get_ssh_connection() as ssh:
-                exit_code, stdout, stderr = ssh.execute(
-                    'docker stop %s' % shlex.quote(container_name),
-                )
-                if exit_code != 0:
-                    raise UserError(
-                        _("Failed to stop container '%s':\n%s")
-                        % (container_name, stderr)
-                    )
-            rec.state = 'stopped'
+        self._run_docker_command_per_server(
+            'stop', _("Failed to stop container '%s':\n%s"),
+        )
+        self.write({'state': 'stopped'})
 
     def action_restart(self):
         """Restart the Docker container via SSH."""
@@ -976,207 +1163,190 @@ class SaasInstance(models.Model):
                     % (rec.subdomain, rec.state)
                 )
             rec._ensure_can_ssh()
-            server = rec.docker_server_id
-            container_name = rec._get_container_name()
-            with server._get_ssh_connection() as ssh:
-                exit_code, stdout, stderr = ssh.execute(
-                    'docker restart %s' % shlex.quote(container_name),
-                )
-                if exit_code != 0:
-                    raise UserError(
-                        _("Failed to restart container '%s':\n%s")
-                        % (container_name, stderr)
-                    )
-            rec.state = 'running'
+        self._run_docker_command_per_server(
+            'restart', _("Failed to restart container '%s':\n%s"),
+        )
+        self.write({'state': 'running'})
 
     def action_redeploy(self):
         """Redeploy: clone pending repos, pull cloned repos, update config/mounts,
         install pending modules, and restart the container."""
-        for rec in self:
-            if rec.state not in ('running', 'stopped', 'suspended'):
+        for instance in self:
+            if instance.state not in ('running', 'stopped', 'suspended'):
                 raise UserError(
                     _("Cannot redeploy instance '%s': must be Running, Stopped, or Suspended (current: %s).")
-                    % (rec.subdomain, rec.state)
+                    % (instance.subdomain, instance.state)
                 )
-            rec._ensure_can_ssh()
-            server = rec.docker_server_id
-            instance_path = rec._get_instance_path()
-
-            # 1. Clone any pending instance repos
-            pending_repos = rec.repo_ids.filtered(lambda r: r.state == 'pending')
-            if pending_repos:
-                pending_repos._clone_repo()
-
-            # 2. Pull all cloned instance repos
-            cloned_repos = rec.repo_ids.filtered(lambda r: r.state == 'cloned')
-            if cloned_repos:
-                with server._get_ssh_connection() as ssh:
-                    for repo in cloned_repos:
-                        repo_path = repo._get_remote_repo_path()
-                        clone_url = repo._get_clone_url()
-                        ssh.execute(
-                            'cd %s && git remote set-url origin %s'
-                            % (shlex.quote(repo_path), shlex.quote(clone_url))
-                        )
-                        rec._append_log("Pulling %s..." % repo.name)
-                        pull_cmd = 'cd %s && git pull origin %s 2>&1' % (
-                            shlex.quote(repo_path), shlex.quote(repo.branch),
-                        )
-                        exit_code, stdout, stderr = ssh.execute(
-                            pull_cmd, timeout=300,
-                        )
-                        if exit_code != 0:
-                            repo.error_message = stdout + '\n' + stderr
-                            raise UserError(
-                                _("Git pull failed for '%s':\n%s\n%s")
-                                % (repo.name, stdout[-500:], stderr[-500:])
+            instance._ensure_can_ssh()
+            # Collect the log lines and write them once at the end
+            with instance._buffered_log() as rec:
+                server = rec.docker_server_id
+                instance_path = rec._get_instance_path()
+
+                # 1. Clone any pending instance repos
+                pending_repos = rec.repo_ids.filtered(lambda r: r.state == 'pending')
+                if pending_repos:
+                    pending_repos._clone_repo()
+
+                # 2. Pull all cloned instance repos
+                cloned_repos = rec.repo_ids.filtered(lambda r: r.state == 'cloned')
+                if cloned_repos:
+                    with server._get_ssh_connection() as ssh:
+                        for repo in cloned_repos:
+                            repo_path = repo._get_remote_repo_path()
+                            clone_url = repo._get_clone_url()
+                            rec._append_log("Pulling %s..." % repo.name)
+                            exit_code, stdout, stderr = ssh.execute(
+                                git_pull_command(clone_url, repo.branch, repo_path),
+                                timeout=300,
+                            )
+                            if exit_code != 0:
+                                repo.error_message = stdout + '\n' + stderr
+                                raise UserError(
+                                    _("Git pull failed for '%s':\n%s\n%s")
+                                    % (repo.name, stdout[-500:], stderr[-500:])
+                                )
+                            repo.last_pull = fields.Datetime.now()
+                            repo.error_message = False
+                            rec._append_log(
+                                "Pulled %s: %s" % (repo.name, stdout.strip()[:200])
                             )
-                        repo.last_pull = fields.Datetime.now()
-                        repo.error_message = False
-                        rec._append_log(
-                            "Pulled %s: %s" % (repo.name, stdout.strip()[:200])
-                        )
-
-            # 3. Clone any pending version repos needed by module lines
-            needed_version_repo_ids = set()
-            for line in rec.module_line_ids:
-                if line.product_id:
-                    tmpl = line.product_id.product_tmpl_id
-                    if tmpl.saas_source_repo_id:
-                        needed_version_repo_ids.add(tmpl.saas_source_repo_id.id)
-                    for mod in tmpl.saas_module_ids:
-                        if mod.saas_source_repo_id:
-                            needed_version_repo_ids.add(mod.saas_source_repo_id.id)
-                if line.module_id:
-                    tmpl = line.module_id.product_tmpl_id
-                    if tmpl.saas_source_repo_id:
-                        needed_version_repo_ids.add(tmpl.saas_source_repo_id.id)
-            if rec.odoo_version_id and needed_version_repo_ids:
-                pending_vrepos = rec.odoo_version_id.repo_ids.filtered(
-                    lambda r: r.state == 'pending' and r.id in needed_version_repo_ids
-                )
-                for vrepo in pending_vrepos:
-                    rec._append_log("Cloning pending version repo %s..." % vrepo.repo_url)
-                    vrepo.action_clone_repo()
-
-            # 4. Update docker-compose.yml and odoo.conf with current mounts
-            rec._append_log("Updating configuration...")
-            repos, version_repos, all_addons_paths = rec._get_all_repo_context()
-            with server._get_ssh_connection() as ssh:
-                dc_context = {
-                    'odoo_image': rec.odoo_version_id.docker_image,
-                    'odoo_version': rec.odoo_version_id.docker_image_tag,
-                    'subdomain': rec.subdomain,
-                    'host_ip': '127.0.0.1',
-                    'xmlrpc_port': rec.xmlrpc_port,
-                    'longpolling_port': rec.longpolling_port,
-                    'network_name': 'net_%s' % rec.subdomain,
-                    'cpu_limit': rec.plan_id.cpu_limit if rec.plan_id else 0,
-                    'ram_limit': rec.plan_id.ram_limit if rec.plan_id else '',
-                    'repos': repos,
-                    'version_repos': version_repos,
-                }
-                dc_content = rec._render_template(
-                    'docker-compose.yml.jinja', dc_context,
-                )
-                ssh.write_file(
-                    '%s/docker-compose.yml' % instance_path, dc_content,
-                )
 
-                psql_server = rec.db_server_id
-                db_host = psql_server.private_ip_v4 or psql_server.ip_v4
-                conf_context = {
-                    'master_pass': rec.admin_password,
-                    'db_host': db_host,
-                    'db_port': psql_server.psql_port or 5432,
-                    'db_user': rec.db_user,
-                    'db_password': rec.db_password,
-                    'proxy_mode': True,
-                    'extra_config': rec._parse_extra_config(),
-                    'repo_addons_paths': all_addons_paths,
-                }
-                conf_content = rec._render_template(
-                    'odoo.conf.jinja', conf_context,
-                )
-                ssh.write_file(
-                    '%s/config/odoo.conf' % instance_path, conf_content,
-                )
-            rec._append_log("Configuration updated.")
+                # 3. Clone any pending version repos needed by module lines
+                needed_version_repo_ids = set()
+                for line in rec.module_line_ids:
+                    if line.product_id:
+                        tmpl = line.product_id.product_tmpl_id
+                        if tmpl.saas_source_repo_id:
+                            needed_version_repo_ids.add(tmpl.saas_source_repo_id.id)
+                        for mod in tmpl.saas_module_ids:
+                            if mod.saas_source_repo_id:
+                                needed_version_repo_ids.add(mod.saas_source_repo_id.id)
+                    if line.module_id:
+                        tmpl = line.module_id.product_tmpl_id
+                        if tmpl.saas_source_repo_id:
+                            needed_version_repo_ids.add(tmpl.saas_source_repo_id.id)
+                if rec.odoo_version_id and needed_version_repo_ids:
+                    pending_vrepos = rec.odoo_version_id.repo_ids.filtered(
+                        lambda r: r.state == 'pending' and r.id in needed_version_repo_ids
+                    )
+                    for vrepo in pending_vrepos:
+                        rec._append_log("Cloning pending version repo %s..." % vrepo.repo_url)
+                        vrepo.action_clone_repo()
 
-            # 5. Install pending modules (if any)
-            pending_lines = rec.module_line_ids.filtered(
-                lambda l: l.state == 'pending'
-            ).sorted('sequence')
+                # 4. Update docker-compose.yml and odoo.conf with current mounts
+                rec._append_log("Updating configuration...")
+                repos, version_repos, all_addons_paths = rec._get_all_repo_context()
+                with server._get_ssh_connection() as ssh:
+                    dc_context = {
+                        'odoo_image': rec.odoo_version_id.docker_image,
+                        'odoo_version': rec.odoo_version_id.docker_image_tag,
+                        'subdomain': rec.subdomain,
+                        'host_ip': '127.0.0.1',
+                        'xmlrpc_port': rec.xmlrpc_port,
+                        'longpolling_port': rec.longpolling_port,
+                        'network_name': 'net_%s' % rec.subdomain,
+                        'cpu_limit': rec.plan_id.cpu_limit if rec.plan_id else 0,
+                        'ram_limit': rec.plan_id.ram_limit if rec.plan_id else '',
+                        'repos': repos,
+                        'version_repos': version_repos,
+                    }
+                    dc_content = rec._render_template(
+                        'docker-compose.yml.jinja', dc_context,
+                    )
 
-            if pending_lines:
-                all_module_names = []
-                for line in pending_lines:
-                    names = line._get_all_technical_names()
-                    names.discard('base')
-                    for n in sorted(names):
-                        if n not in all_module_names:
-                            all_module_names.append(n)
+                    psql_server = rec.db_server_id
+                    db_host = psql_server.private_ip_v4 or psql_server.ip_v4
+                    conf_context = {
+                        'master_pass': rec.admin_password,
+                        'db_host': db_host,
+                        'db_port': psql_server.psql_port or 5432,
+                        'db_user': rec.db_user,
+                        'db_password': rec.db_password,
+                        'proxy_mode': True,
+                        'extra_config': rec._parse_extra_config(),
+                        'repo_addons_paths': all_addons_paths,
+                    }
+                    conf_content = rec._render_template(
+                        'odoo.conf.jinja', conf_context,
+                    )
+                    ssh.write_files({
+                        '%s/docker-compose.yml' % instance_path: dc_content,
+                        '%s/config/odoo.conf' % instance_path: conf_content,
+                    })
+                rec._append_log("Configuration updated.")
+
+                # 5. Install pending modules (if any)
+                pending_lines = rec.module_line_ids.filtered(
+                    lambda l: l.state == 'pending'
+                ).sorted('sequence')
 
-                if all_module_names:
-                    modules_to_install = ','.join(all_module_names)
-                    for line in pending_lines:
-                        names = line._get_all_technical_names()
-                        names.discard('base')
-                        label = line.product_id.name if line.product_id else (
-                            line.module_id.name if line.module_id else ','.join(sorted(names))
-                        )
-                        rec._append_log(
-                            "Line [%d] %s: %s" % (line.sequence, label, ','.join(sorted(names)))
-                        )
+                if pending_lines:
+                    all_module_names = [
+                        n for n in self.env['product.template']._get_install_order(
+                            pending_lines._get_product_templates().ids
+                        ) if n != 'base'
+                    ]
+
+                    if all_module_names:
+                        modules_to_install = ','.join(all_module_names)
+                        for line in pending_lines:
+                            names = line._get_all_technical_names() - {'base'}
+                            label = line.product_id.name if line.product_id else (
+                                line.module_id.name if line.module_id else ','.join(sorted(names))
+                            )
+                            rec._append_log(
+                                "Line [%d] %s: %s" % (line.sequence, label, ','.join(sorted(names)))
+                            )
 
-                    rec._append_log(
-                        "Installing modules: %s" % modules_to_install
-                    )
-                    with server._get_ssh_connection() as ssh:
-                        install_cmd = (
-                            'cd %s && docker compose run --rm -T odoo '
-                            'odoo -d %s '
-                            '-i %s '
-                            '--without-demo=all '
-                            '--stop-after-init '
-                            '--no-http 2>&1'
-                        ) % (
-                            shlex.quote(instance_path),
-                            shlex.quote(rec.subdomain),
-                            shlex.quote(modules_to_install),
-                        )
-                        exit_code, stdout, stderr = ssh.execute(
-                            install_cmd, timeout=600,
-                        )
                         rec._append_log(
-                            "Install output (last 1000 chars):\n%s"
-                            % stdout[-1000:]
+                            "Installing modules: %s" % modules_to_install
                         )
-                        if exit_code != 0:
-                            for line in pending_lines:
-                                line.state = 'failed'
-                                line.log = stdout[-2000:] + '\n' + stderr[-500:]
-                            raise UserError(
-                                _("Module installation failed:\n%s\n%s")
-                                % (stdout[-500:], stderr[-500:])
+                        with server._get_ssh_connection() as ssh:
+                            install_cmd = (
+                                'cd %s && docker compose run --rm -T odoo '
+                                'odoo -d %s '
+                                '-i %s '
+                                '--without-demo=all '
+                                '--stop-after-init '
+                                '--no-http 2>&1'
+                            ) % (
+                                shlex.quote(instance_path),
+                                shlex.quote(rec.subdomain),
+                                shlex.quote(modules_to_install),
                             )
-
-                    rec._append_log("Modules installed successfully.")
-                    all_products = self.env['product.product']
-                    for line in pending_lines:
-                        line.state = 'installed'
-                        line.log = ''
-                        if line.product_id:
-                            module_tmpls = line.product_id.product_tmpl_id.saas_module_ids
-                            all_products |= module_tmpls.mapped('product_variant_id')
-                        elif line.module_id:
-                            all_products |= line.module_id
-                    if all_products:
-                        rec.installed_module_ids = [(4, p.id) for p in all_products]
-
-            # 6. Restart the container
-            rec._restart_container()
-            rec.state = 'running'
+                            exit_code, stdout, stderr = ssh.execute(
+                                install_cmd, timeout=600, tail_bytes=4096,
+                            )
+                            rec._append_log(
+                                "Install output (last 1000 chars):\n%s"
+                                % stdout[-1000:]
+                            )
+                            if exit_code != 0:
+                                pending_lines.write({
+                                    'state': 'failed',
+                                    'log': stdout[-2000:] + '\n' + stderr[-500:],
+                                })
+                                raise UserError(
+                                    _("Module installation failed:\n%s\n%s")
+                                    % (stdout[-500:], stderr[-500:])
+                                )
+
+                        rec._append_log("Modules installed successfully.")
+                        pending_lines.write({'state': 'installed', 'log': ''})
+                        all_products = self.env['product.product']
+                        for line in pending_lines:
+                            if line.product_id:
+                                module_tmpls = line.product_id.product_tmpl_id.saas_module_ids
+                                all_products |= module_tmpls.mapped('product_variant_id')
+                            elif line.module_id:
+                                all_products |= line.module_id
+                        if all_products:
+                            rec.installed_module_ids = [(4, pid) for pid in all_products.ids]
+
+                # 6. Restart the container
+                rec._restart_container()
+                rec.state = 'running'
 
     def action_suspend(self):
         """Stop container and set state to suspended."""
@@ -1187,22 +1357,13 @@ class SaasInstance(models.Model):
                     % (rec.subdomain, rec.state)
                 )
             rec._ensure_can_ssh()
-            server = rec.docker_server_id
-            container_name = rec._get_container_name()
-            with server._get_ssh_connection() as ssh:
-                exit_code, stdout, stderr = ssh.execute(
-                    'docker stop %s' % shlex.quote(container_name),
-                )
-                if exit_code != 0:
-                    raise UserError(
-                        _("Failed to stop container '%s':\n%s")
-                        % (container_name, stderr)
-                    )
-            rec.state = 'suspended'
+        self._run_docker_command_per_server(
+            'stop', _("Failed to stop container '%s':\n%s"),
+        )
+        self.write({'state': 'suspended'})
 
     def action_cancel(self):
-        for rec in self:
-            rec.state = 'cancelled'
+        self.write({'state': 'cancelled'})
 
     def action_draft(self):
         """Reset to draft state (only from failed or cancelled)."""
@@ -1211,36 +1372,37 @@ class SaasInstance(models.Model):
                 raise UserError(
                     _("Can only reset to draft from 'Failed' or 'Cancelled' state.")
                 )
-            rec.state = 'draft'
+        self.write({'state': 'draft'})
+
+    def _drop_postgresql(self, ssh=None):
+        """Drop the PostgreSQL database and role on the database server via SSH.
 
-    def _drop_postgresql(self):
-        """Drop the PostgreSQL database and role on the database server via SSH."""
+        Both drops run in one psql call. ``ssh`` is reused as in
+        :meth:`_provision_postgresql`.
+        """
         self.ensure_one()
         psql_server = self.db_server_id
-        if not psql_server:
+        if not psql_server or not (self.subdomain or self.db_user):
             return
 
-        db_name = self.subdomain
-        db_user = self.db_user
-
-        with psql_server._get_ssh_connection() as ssh:
-            if db_name:
-                drop_db_cmd = (
-                    "sudo -u postgres psql -tc "
-                    "\"SELECT 1 FROM pg_database WHERE datname=%s\" "
-                    "| grep -q 1 "
-                    "&& sudo -u postgres dropdb %s"
-                ) % (shlex.quote("'%s'" % db_name), shlex.quote(db_name))
-                ssh.execute(drop_db_cmd)
-
-            if db_user:
-                drop_role_cmd = (
-                    "sudo -u postgres psql -tc "
-                    "\"SELECT 1 FROM pg_roles WHERE rolname=%s\" "
-                    "| grep -q 1 "
-                    "&& sudo -u postgres dropuser %s"
-                ) % (shlex.quote("'%s'" % db_user), shlex.quote(db_user))
-                ssh.execute(drop_role_cmd)
+        tag = '$saas_%s$' % secrets.token_hex(8)
+        sql_script = _PSQL_DROP_SQL % {
+            'db_lit': '%s%s%s' % (tag, self.subdomain or '', tag),
+            'user_lit': '%s%s%s' % (tag, self.db_user or '', tag),
+        }
+        delimiter = 'SAAS_END_%s' % secrets.token_hex(8)
+        drop_cmd = "sudo -u postgres psql -v ON_ERROR_STOP=1 <<'%s'\n%s%s" % (delimiter, sql_script, delimiter)
+
+        connection = psql_server._get_ssh_connection()
+        if ssh is not None and ssh.same_target(connection):
+            connection = nullcontext(ssh)
+        with connection as ssh:
+            exit_code, stdout, stderr = ssh.execute(drop_cmd)
+            if exit_code != 0:
+                _logger.warning(
+                    "Dropping PostgreSQL database/role failed for %s: %s",
+                    self.subdomain, stderr,
+                )
 
     def action_delete_instance(self):
         """Remove container, volumes, network, database, db user, and instance folder."""
@@ -1254,34 +1416,37 @@ class SaasInstance(models.Model):
             server = rec.docker_server_id
             instance_path = rec._get_instance_path()
 
+            # Compose down (best effort), folder removal, Nginx config and SSL
+            # certificate removal in one exec; status 10 means rm -rf failed.
+            teardown_cmd = (
+                'if ! out=$(cd %(path)s && docker compose down -v --remove-orphans 2>&1); then '
+                'printf "%%s\\n" "$out" >&2; echo SAAS_DOWN_FAILED; fi; '
+                'rm -rf %(path)s || exit 10; '
+                'rm -f %(nginx)s; systemctl reload nginx 2>&1; '
+            ) % {
+                'path': shlex.quote(instance_path),
+                'nginx': shlex.quote('/etc/nginx/sites-enabled/%s' % rec.subdomain),
+            }
+            if rec.name:
+                teardown_cmd += (
+                    'certbot delete --cert-name %s --non-interactive 2>&1; '
+                    % shlex.quote(rec.name)
+                )
+            teardown_cmd += 'exit 0'
+
             with server._get_ssh_connection() as ssh:
-                down_cmd = 'cd %s && docker compose down -v --remove-orphans 2>&1' % shlex.quote(instance_path)
-                exit_code, stdout, stderr = ssh.execute(down_cmd)
-                if exit_code != 0:
+                exit_code, stdout, stderr = ssh.execute(teardown_cmd)
+                if 'SAAS_DOWN_FAILED' in stdout:
                     _logger.warning(
                         "docker compose down failed for %s: %s", rec.subdomain, stderr
                     )
-
-                exit_code, stdout, stderr = ssh.execute(
-                    'rm -rf %s' % shlex.quote(instance_path),
-                )
                 if exit_code != 0:
                     raise UserError(
                         _("Failed to remove instance directory '%s':\n%s")
                         % (instance_path, stderr)
                     )
 
-                # Remove Nginx config and SSL certificate
-                nginx_path = '/etc/nginx/sites-enabled/%s' % rec.subdomain
-                ssh.execute('rm -f %s' % shlex.quote(nginx_path))
-                ssh.execute('systemctl reload nginx 2>&1')
-                if rec.name:
-                    ssh.execute(
-                        'certbot delete --cert-name %s --non-interactive 2>&1'
-                        % shlex.quote(rec.name)
-                    )
-
-            rec._drop_postgresql()
+                rec._drop_postgresql(ssh)
 
             # Delete all backups from cloud storage
             for backup in rec.backup_ids.filtered(
@@ -1483,10 +1648,6 @@ class SaasInstance(models.Model):
             dc_content = self._render_template(
                 'docker-compose.yml.jinja', dc_context,
             )
-            ssh.write_file(
-                '%s/docker-compose.yml' % instance_path, dc_content,
-            )
-            self._append_log("docker-compose.yml updated.")
 
             # Regenerate odoo.conf with repo addons paths
             self._append_log("Updating odoo.conf with repo addons paths...")
@@ -1505,10 +1666,11 @@ class SaasInstance(models.Model):
             conf_content = self._render_template(
                 'odoo.conf.jinja', conf_context,
             )
-            ssh.write_file(
-                '%s/config/odoo.conf' % instance_path, conf_content,
-            )
-            self._append_log("odoo.conf updated.")
+            ssh.write_files({
+                '%s/docker-compose.yml' % instance_path: dc_content,
+                '%s/config/odoo.conf' % instance_path: conf_content,
+            })
+            self._append_log("docker-compose.yml and odoo.conf updated.")
 
         # Restart the container
         self._restart_container()
@@ -1522,16 +1684,17 @@ class SaasInstance(models.Model):
 
         with server._get_ssh_connection() as ssh:
             self._append_log("Restarting container...")
-            # Use docker compose down + up to pick up volume changes
-            down_cmd = 'cd %s && docker compose down 2>&1' % shlex.quote(instance_path)
-            exit_code, stdout, stderr = ssh.execute(down_cmd)
-            if exit_code != 0:
+            # Use docker compose down + up to pick up volume changes, in one
+            # exec; status 10 marks a failure before the up step.
+            restart_cmd = (
+                'cd %s || exit 10; docker compose down 2>&1 || exit 10; '
+                'docker compose up -d 2>&1'
+            ) % shlex.quote(instance_path)
+            exit_code, stdout, stderr = ssh.execute(restart_cmd)
+            if exit_code == 10:
                 raise UserError(
                     _("docker compose down failed:\n%s\n%s") % (stdout, stderr)
                 )
-
-            up_cmd = 'cd %s && docker compose up -d 2>&1' % shlex.quote(instance_path)
-            exit_code, stdout, stderr = ssh.execute(up_cmd)
             if exit_code != 0:
                 raise UserError(
                     _("docker compose up -d failed:\n%s\n%s") % (stdout, stderr)
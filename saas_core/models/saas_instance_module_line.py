@@ -1,4 +1,4 @@
-from odoo import fields, models
+from odoo import fields, models, tools
 
 
 class SaasInstanceModuleLine(models.Model):
@@ -64,20 +64,23 @@ class SaasInstanceModuleLine(models.Model):
         help='Detailed output captured during the installation attempt (populated on failure).',
     )
 
+    def _get_product_templates(self):
+        """Return the bundle and module templates selected on these lines."""
+        return self.product_id.product_tmpl_id | self.module_id.product_tmpl_id
+
+    @tools.ormcache('self.product_id.id', 'self.module_id.id')
     def _get_all_technical_names(self):
-        """Return a set of all technical module names for this line including dependencies."""
-        self.ensure_one()
-        names = set()
+        """Return a frozenset of all technical module names for this line including dependencies.
 
-        if self.product_id:
-            for mod in self.product_id.product_tmpl_id.saas_module_ids:
-                names.add(mod.technical_name)
-                for dep in mod.saas_dependency_ids:
-                    names.add(dep.technical_name)
-        elif self.module_id:
-            tmpl = self.module_id.product_tmpl_id
-            names.add(tmpl.technical_name)
-            for dep in tmpl.saas_dependency_ids:
-                names.add(dep.technical_name)
+        Dependencies are followed transitively through the same recursive
+        query as product.template._get_install_order(), so dependencies of
+        dependencies are included too.
 
-        return names
+        Cached per bundle/module; product.template clears the cache when
+        modules, dependencies or technical names change.
+        """
+        self.ensure_one()
+        tmpl = self.product_id.product_tmpl_id or self.module_id.product_tmpl_id
+        if not tmpl:
+            return frozenset()
+        return frozenset(self.env['product.template']._get_install_order(tmpl.ids))
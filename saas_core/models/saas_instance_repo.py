@@ -4,6 +4,8 @@ import shlex
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
 
+from ..utils import git_clone_command, git_pull_command
+
 _logger = logging.getLogger(__name__)
 
 
@@ -123,26 +125,12 @@ class SaasInstanceRepo(models.Model):
 
             try:
                 with server._get_ssh_connection() as ssh:
-                    # Create parent directory
-                    parent = '/'.join(repo_path.rsplit('/', 1)[:-1])
-                    ssh.execute('mkdir -p %s' % shlex.quote(parent))
-
-                    # Remove existing repo dir if re-cloning
-                    ssh.execute('rm -rf %s' % shlex.quote(repo_path))
-
-                    # Clone
                     instance._append_log(
                         "Cloning repo %s (branch: %s)..." % (rec.repo_url, rec.branch)
                     )
-                    clone_cmd = (
-                        'git clone --branch %s --single-branch '
-                        '--depth 1 %s %s 2>&1'
-                    ) % (
-                        shlex.quote(rec.branch),
-                        shlex.quote(clone_url),
-                        shlex.quote(repo_path),
+                    exit_code, stdout, stderr = ssh.execute(
+                        git_clone_command(clone_url, rec.branch, repo_path), timeout=300,
                     )
-                    exit_code, stdout, stderr = ssh.execute(clone_cmd, timeout=300)
                     if exit_code != 0:
                         rec.state = 'error'
                         rec.error_message = stdout + '\n' + stderr
@@ -151,11 +139,6 @@ class SaasInstanceRepo(models.Model):
                             % (stdout[-500:], stderr[-500:])
                         )
 
-                    # Set permissions
-                    ssh.execute(
-                        'chmod -R 755 %s' % shlex.quote(repo_path)
-                    )
-
                     instance._append_log("Repository cloned successfully.")
                     rec.state = 'cloned'
                     rec.last_pull = fields.Datetime.now()
@@ -190,19 +173,12 @@ class SaasInstanceRepo(models.Model):
 
             try:
                 with server._get_ssh_connection() as ssh:
-                    # Update remote URL in case token changed
-                    ssh.execute(
-                        'cd %s && git remote set-url origin %s'
-                        % (shlex.quote(repo_path), shlex.quote(clone_url))
-                    )
-
                     instance._append_log(
                         "Pulling latest changes for %s..." % rec.name
                     )
-                    pull_cmd = 'cd %s && git pull origin %s 2>&1' % (
-                        shlex.quote(repo_path), shlex.quote(rec.branch),
+                    exit_code, stdout, stderr = ssh.execute(
+                        git_pull_command(clone_url, rec.branch, repo_path), timeout=300,
                     )
-                    exit_code, stdout, stderr = ssh.execute(pull_cmd, timeout=300)
                     if exit_code != 0:
                         rec.error_message = stdout + '\n' + stderr
                         raise UserError(
@@ -1,10 +1,67 @@
+import base64
+import io
 import logging
+import secrets
+import shlex
+import tarfile
+from collections import defaultdict
+from contextlib import contextmanager
 
 from odoo import fields, models, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..utils import SSHCommandError, json_loads, run_parallel
+
 _logger = logging.getLogger(__name__)
 
+_ICON_FETCH_MAX_PARALLEL = 4  # concurrent icon batches per fetch
+
+# Scripts run with ``python3 -`` inside the version's container. They are
+# sent on stdin, so they need no shell quoting.
+
+# Print one JSON object per application module (NDJSON): no delimiter that a
+# manifest field could contain, and a single loads() per line on our side.
+_MODULE_SCAN_SCRIPT = """\
+import ast, glob, json, os
+
+paths = ['/usr/lib/python3/dist-packages/odoo/addons', '/mnt/extra-addons']
+for p in paths:
+    # One directory scan per addons path; only existing manifests come back
+    for manifest_path in sorted(glob.glob(os.path.join(p, '*', '__manifest__.py'))):
+        d = os.path.basename(os.path.dirname(manifest_path))
+        with open(manifest_path) as f:
+            m = ast.literal_eval(f.read())
+        if not m.get('application'):
+            continue
+        # mtime-size stamp of the icon, so unchanged icons are not refetched
+        try:
+            st = os.stat(os.path.join(p, d, 'static', 'description', 'icon.png'))
+            i = '%d-%d' % (st.st_mtime, st.st_size)
+        except OSError:
+            i = ''
+        print(json.dumps({
+            't': d, 'n': m.get('name', d), 's': m.get('summary', ''),
+            'a': m.get('author', ''), 'd': m.get('depends', []), 'i': i,
+        }))
+"""
+
+# Write the icons of the modules given as arguments as a tar stream of raw
+# PNGs named after their module, a third smaller on the wire than base64.
+_ICON_FETCH_SCRIPT = """\
+import os, sys, tarfile
+
+paths = ['/usr/lib/python3/dist-packages/odoo/addons', '/mnt/extra-addons']
+t = tarfile.open(fileobj=sys.stdout.buffer, mode='w|', dereference=True)
+for p in paths:
+    if not os.path.isdir(p):
+        continue
+    for m in sys.argv[1:]:
+        icon = os.path.join(p, m, 'static', 'description', 'icon.png')
+        if os.path.isfile(icon):
+            t.add(icon, arcname=m)
+t.close()
+"""
+
 
 class SaasOdooVersion(models.Model):
     _name = 'saas.odoo.version'
@@ -62,8 +119,14 @@ class SaasOdooVersion(models.Model):
     )
 
     def _compute_module_count(self):
+        data = self.env['product.template']._read_group(
+            [('saas_odoo_version_id', 'in', self.ids), ('saas_type', '=', 'module')],
+            ['saas_odoo_version_id'],
+            ['__count'],
+        )
+        counts = {version.id: count for version, count in data}
         for rec in self:
-            rec.module_count = len(rec.module_ids)
+            rec.module_count = counts.get(rec.id, 0)
 
     def _get_container_server(self):
         """Return the first available container server or raise."""
@@ -83,71 +146,95 @@ class SaasOdooVersion(models.Model):
             )
         return '%s:%s' % (self.docker_image, self.docker_image_tag)
 
+    @contextmanager
+    def _long_lived_container(self, server, image):
+        """Start a throwaway container of ``image`` on ``server`` and yield its name.
+
+        Scripts then run in it with ``docker exec``, skipping the container
+        setup that every ``docker run --rm`` pays. The container is removed
+        on exit.
+        """
+        name = 'saas_fetch_%s' % secrets.token_hex(6)
+        with server._get_ssh_connection() as ssh:
+            exit_code, stdout, stderr = ssh.execute(
+                'docker run -d --rm --name %s --entrypoint sleep %s infinity'
+                % (name, shlex.quote(image)),
+                timeout=300,
+            )
+        if exit_code != 0:
+            raise UserError(
+                _("Failed to start a container from image '%s':\n%s")
+                % (image, stderr)
+            )
+        try:
+            yield name
+        finally:
+            try:
+                with server._get_ssh_connection() as ssh:
+                    ssh.execute('docker rm -f %s' % name)
+            except Exception:
+                _logger.warning("Failed to remove container %s", name, exc_info=True)
+
     def action_fetch_modules(self):
         """Fetch available standard modules from the Docker image."""
         self.ensure_one()
         image = self._get_docker_image()
         server = self._get_container_server()
 
-        scan_script = (
-            "import ast, os, sys; "
-            "paths = ['/usr/lib/python3/dist-packages/odoo/addons', '/mnt/extra-addons']; "
-            "["
-            "("
-            "  lambda m: sys.stdout.write("
-            "    d + '|||' + m.get('name', d) + '|||' "
-            "    + m.get('summary', '').replace('\\\\n', ' ').replace('\\n', ' ') + '|||' "
-            "    + m.get('category', '') + '|||' "
-            "    + m.get('author', '') + '|||' "
-            "    + ','.join(m.get('depends', [])) + '\\n'"
-            "  )"
-            ")(ast.literal_eval(open(os.path.join(p, d, '__manifest__.py')).read())) "
-            "if os.path.isfile(os.path.join(p, d, '__manifest__.py')) "
-            "and ast.literal_eval(open(os.path.join(p, d, '__manifest__.py')).read()).get('application') "
-            "else None "
-            "for p in paths if os.path.isdir(p) "
-            "for d in sorted(os.listdir(p)) "
-            "if os.path.isdir(os.path.join(p, d))"
-            "]"
-        )
-
-        cmd = "docker run --rm %s python3 -c \"%s\" 2>/dev/null" % (image, scan_script)
+        with self._long_lived_container(server, image) as container:
+            icon_stamps = self._fetch_modules_in_container(server, image, container)
+            self._fetch_module_icons(server, container, icon_stamps)
 
-        with server._get_ssh_connection() as ssh:
-            exit_code, stdout, stderr = ssh.execute(cmd, timeout=120)
-            if exit_code != 0:
-                raise UserError(
-                    _("Failed to fetch modules from image '%s':\n%s")
-                    % (image, stderr)
-                )
-
-        # Only touch standard modules — leave custom repo modules untouched
-        existing = {
-            m.technical_name: m
-            for m in self.module_ids.filtered(
-                lambda m: m.saas_source != 'custom'
-            )
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Modules Fetched"),
+                'message': _("%d standard modules found for %s.") % (len(icon_stamps), image),
+                'type': 'success',
+                'sticky': False,
+            },
         }
-        found_names = set()
-        deps_map = {}
 
+    def _fetch_modules_in_container(self, server, image, container):
+        """Run the module scan in ``container`` and sync the standard modules.
+
+        Returns:
+            dict: technical name -> icon stamp (empty without an icon) of
+            every module found in the image.
+        """
         ProductTemplate = self.env['product.template']
 
-        for line in stdout.strip().splitlines():
-            line = line.strip()
-            if not line or '|||' not in line:
-                continue
-            parts = line.split('|||', 5)
-            technical_name = parts[0].strip()
-            display_name = parts[1].strip() if len(parts) > 1 else technical_name
-            summary = parts[2].strip() if len(parts) > 2 else ''
-            category = parts[3].strip() if len(parts) > 3 else ''
-            author = parts[4].strip() if len(parts) > 4 else ''
-            depends_str = parts[5].strip() if len(parts) > 5 else ''
-            found_names.add(technical_name)
-
-            if depends_str:
-                deps_map[technical_name] = [d.strip() for d in depends_str.split(',') if d.strip()]
+        # Only touch standard modules — leave custom repo modules untouched.
+        # Fetch just the columns compared below rather than every field of
+        # every module.
+        standard_modules = ProductTemplate.search_fetch(
+            [
+                ('saas_odoo_version_id', '=', self.id),
+                ('saas_type', '=', 'module'),
+                ('saas_source', '!=', 'custom'),
+            ],
+            ['technical_name', 'name', 'description_sale', 'saas_author', 'saas_source'],
+        )
+        existing = {m.technical_name: m for m in standard_modules}
+        icon_stamps = {}
+        deps_map = {}
+
+        to_create = []
+        to_update = defaultdict(ProductTemplate.browse)
+
+        # Rows are synced as the scan prints them instead of once the whole
+        # output has been buffered.
+        for row in self._iter_module_scan(server, image, container):
+            technical_name = row['t']
+            display_name = (row.get('n') or technical_name).strip()
+            summary = ' '.join((row.get('s') or '').split())
+            author = (row.get('a') or '').strip()
+            depends = row.get('d') or []
+            icon_stamps[technical_name] = row.get('i') or ''
+
+            if depends:
+                deps_map[technical_name] = [d.strip() for d in depends if d.strip()]
 
             vals = {
                 'name': display_name,
@@ -156,8 +243,10 @@ class SaasOdooVersion(models.Model):
                 'saas_source': 'standard',
             }
 
-            if technical_name in existing:
-                existing[technical_name].write(vals)
+            record = existing.get(technical_name)
+            if record:
+                if any((record[fname] or '') != value for fname, value in vals.items()):
+                    to_update[tuple(vals.items())] |= record
             else:
                 vals.update({
                     'technical_name': technical_name,
@@ -165,44 +254,77 @@ class SaasOdooVersion(models.Model):
                     'saas_type': 'module',
                     'type': 'service',
                 })
-                ProductTemplate.create(vals)
+                to_create.append(vals)
+
+        # One write per distinct set of values and one batched create,
+        # instead of a statement per module.
+        for items, records in to_update.items():
+            records.write(dict(items))
+        if to_create:
+            ProductTemplate.create(to_create)
 
         # Only remove standard modules that disappeared
-        to_remove = self.module_ids.filtered(
-            lambda m: m.saas_source != 'custom' and m.technical_name not in found_names
+        to_remove = standard_modules.filtered(
+            lambda m: m.technical_name not in icon_stamps
         )
         if to_remove:
             to_remove.unlink()
 
         # Resolve dependencies
         all_modules = {m.technical_name: m for m in self.module_ids}
-        for tech_name, dep_names in deps_map.items():
-            if tech_name not in all_modules:
-                continue
-            dep_records = ProductTemplate.browse()
-            for dep_name in dep_names:
-                if dep_name in all_modules:
-                    dep_records |= all_modules[dep_name]
-            all_modules[tech_name].saas_dependency_ids = dep_records
+        ProductTemplate._set_saas_dependencies(deps_map, all_modules)
 
-        self._fetch_module_icons(server, image)
+        return icon_stamps
 
-        return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _("Modules Fetched"),
-                'message': _("%d standard modules found for %s.") % (len(found_names), image),
-                'type': 'success',
-                'sticky': False,
-            },
-        }
+    def _iter_module_scan(self, server, image, container):
+        """Run the module scan in ``container`` and yield one dict per module.
+
+        The output is read line by line as the remote script prints it.
+        """
+        cmd = "docker exec -i %s python3 - 2>/dev/null" % container
+        try:
+            with server._get_ssh_connection() as ssh:
+                for line in ssh.execute_iter(
+                    cmd, timeout=120, stdin_data=_MODULE_SCAN_SCRIPT,
+                ):
+                    line = line.strip()
+                    if not line.startswith('{'):
+                        continue
+                    try:
+                        row = json_loads(line)
+                    except ValueError:
+                        _logger.warning("Skipping unparsable module scan line: %s", line[:200])
+                        continue
+                    yield row
+        except SSHCommandError as e:
+            raise UserError(
+                _("Failed to fetch modules from image '%s':\n%s")
+                % (image, e.stderr)
+            )
 
-    def _fetch_module_icons(self, server, image):
-        """Fetch module icons from the Docker image for standard modules without an image."""
+    def _fetch_module_icons(self, server, container, icon_stamps):
+        """Fetch module icons from a running container of the version's image
+        for standard modules without an image or whose icon changed.
+
+        Args:
+            icon_stamps: technical name -> icon stamp, as returned by
+                :meth:`_fetch_modules_in_container`
+        """
         self.ensure_one()
-        modules_needing_icons = self.module_ids.filtered(
-            lambda m: not m.image_1920 and m.saas_source != 'custom'
+        ProductTemplate = self.env['product.template']
+        domain = [
+            ('saas_odoo_version_id', '=', self.id),
+            ('saas_type', '=', 'module'),
+            ('saas_source', '!=', 'custom'),
+        ]
+        # Filter in SQL: reading image_1920 to test it would load every
+        # stored icon from its attachment.
+        modules_needing_icons = ProductTemplate.search(domain + [('image_1920', '=', False)])
+        modules_needing_icons |= ProductTemplate.search_fetch(
+            domain, ['technical_name', 'saas_icon_hash'],
+        ).filtered(
+            lambda m: icon_stamps.get(m.technical_name)
+            and m.saas_icon_hash != icon_stamps[m.technical_name]
         )
         if not modules_needing_icons:
             return
@@ -211,45 +333,59 @@ class SaasOdooVersion(models.Model):
         batch_size = 100
         existing_map = {m.technical_name: m for m in modules_needing_icons}
 
-        for i in range(0, len(tech_names), batch_size):
-            batch = tech_names[i:i + batch_size]
-            self._fetch_icon_batch(server, image, batch, existing_map)
-
-    def _fetch_icon_batch(self, server, image, tech_names, existing_map):
-        """Fetch icons for a batch of module technical names."""
-        icon_script = (
-            "import base64, os, sys; "
-            "paths = ['/usr/lib/python3/dist-packages/odoo/addons', '/mnt/extra-addons']; "
-            "modules = %r; "
-            "["
-            "  sys.stdout.write(m + '|||' + base64.b64encode("
-            "    open(os.path.join(p, m, 'static', 'description', 'icon.png'), 'rb').read()"
-            "  ).decode() + '\\n') "
-            "  for p in paths if os.path.isdir(p) "
-            "  for m in modules "
-            "  if os.path.isfile(os.path.join(p, m, 'static', 'description', 'icon.png'))"
-            "]"
-        ) % tech_names
-
-        cmd = "docker run --rm %s python3 -c \"%s\" 2>/dev/null" % (image, icon_script)
-
-        with server._get_ssh_connection() as ssh:
-            exit_code, stdout, stderr = ssh.execute(cmd, timeout=300)
-
-        if exit_code != 0:
-            _logger.warning("Failed to fetch module icons: %s", stderr[:500])
-            return
-
-        for line in stdout.strip().splitlines():
-            if '|||' not in line:
+        # Batches are independent docker execs on the same container: fetch
+        # them concurrently, then set the images from this thread.
+        batches = [
+            (server._get_ssh_connection(), container, tech_names[i:i + batch_size])
+            for i in range(0, len(tech_names), batch_size)
+        ]
+        results = run_parallel(
+            lambda batch: self._fetch_icon_batch(*batch), batches,
+            max_workers=_ICON_FETCH_MAX_PARALLEL,
+        )
+        for icons, exc in results:
+            if exc is not None:
+                _logger.warning("Failed to fetch module icons: %s", exc)
                 continue
-            tech_name, icon_b64 = line.split('|||', 1)
-            tech_name = tech_name.strip()
-            icon_b64 = icon_b64.strip()
-            if tech_name in existing_map and icon_b64:
+            for tech_name, icon in icons.items():
                 try:
-                    existing_map[tech_name].image_1920 = icon_b64
+                    existing_map[tech_name].write({
+                        'image_1920': base64.b64encode(icon),
+                        'saas_icon_hash': icon_stamps.get(tech_name) or False,
+                    })
                 except Exception:
                     _logger.warning(
                         "Failed to set icon for module %s", tech_name
                     )
+
+    def _fetch_icon_batch(self, connection, container, tech_names):
+        """Fetch icons for a batch of module technical names.
+
+        Runs in a worker thread, so it only uses the given SSHConnection and
+        never the ORM.
+
+        Returns:
+            dict: technical name -> raw icon.png bytes
+        """
+        cmd = "docker exec -i %s python3 - %s 2>/dev/null" % (
+            container, ' '.join(shlex.quote(name) for name in tech_names),
+        )
+
+        with connection as ssh:
+            exit_code, stdout, stderr = ssh.execute_bytes(
+                cmd, timeout=300, stdin_data=_ICON_FETCH_SCRIPT,
+            )
+
+        if exit_code != 0 or not stdout:
+            _logger.warning("Failed to fetch module icons: %s", stderr[:500])
+            return {}
+
+        wanted = set(tech_names)
+        icons = {}
+        with tarfile.open(fileobj=io.BytesIO(stdout), mode='r|') as tar:
+            for member in tar:
+                if member.isfile() and member.name in wanted:
+                    icon = tar.extractfile(member).read()
+                    if icon:
+                        icons[member.name] = icon
+        return icons
@@ -0,0 +1,180 @@
+from odoo import fields, models, _
+from odoo.exceptions import UserError, ValidationError
+
+from ..utils import SSHConnection, run_parallel, tcp_probe
+
+
+class SaasServerSshMixin(models.AbstractModel):
+    """SSH access settings and helpers shared by the Docker and PostgreSQL host servers.
+
+    Inheriting models are expected to define a ``name`` field, used in error
+    messages.
+    """
+    _name = 'saas.server.ssh.mixin'
+    _description = 'SaaS Server SSH Mixin'
+
+    ssh_key_pair_id = fields.Many2one(
+        'saas.ssh.key.pair',
+        string='SSH Key Pair',
+        help='SSH key used to authenticate when connecting to this server.',
+    )
+    ssh_user = fields.Char(
+        string='SSH User',
+        default='root',
+        help='Operating system user for the SSH connection (e.g. root, ubuntu).',
+    )
+    ssh_port = fields.Integer(
+        string='SSH Port',
+        default=22,
+        help='TCP port on which the SSH daemon listens.',
+    )
+    ip_v4 = fields.Char(
+        string='Public IPv4',
+        help='Public IPv4 address of this server, reachable from the internet.',
+    )
+    private_ip_v4 = fields.Char(
+        string='Private IPv4',
+        help='Private / internal IPv4 address used for communication '
+             'between servers on the same network.',
+    )
+    ssh_connect_using = fields.Selection(
+        selection=[
+            ('public_ip', 'Public IP'),
+            ('private_ip', 'Private IP'),
+        ],
+        string='Connect via',
+        default='public_ip',
+        required=True,
+        help='Which IP address the SaaS manager should use when opening SSH sessions.',
+    )
+
+    def _get_ssh_ip(self):
+        """Return the IP to use for SSH based on ssh_connect_using."""
+        self.ensure_one()
+        if self.ssh_connect_using == 'private_ip':
+            if not self.private_ip_v4:
+                raise ValidationError(
+                    _("Private IP address is required on server '%s' when SSH is set to use Private IP.")
+                    % self.name
+                )
+            return self.private_ip_v4
+        if not self.ip_v4:
+            raise ValidationError(
+                _("Public IP address is required on server '%s'.") % self.name
+            )
+        return self.ip_v4
+
+    def _get_ssh_connection(self):
+        """Return an SSHConnection context manager for this server."""
+        self.ensure_one()
+        key_pair = self.ssh_key_pair_id
+        if not key_pair or not key_pair.private_key_file:
+            raise ValidationError(
+                _("SSH key pair with a private key file is required on server '%s'.")
+                % self.name
+            )
+        return SSHConnection(
+            host=self._get_ssh_ip(),
+            port=self.ssh_port or 22,
+            user=self.ssh_user or 'root',
+            key_type=key_pair.type or 'rsa',
+            pkey=key_pair._get_paramiko_pkey(),
+        )
+
+    def _ssh_execute_parallel(self, command):
+        """Run ``command`` on every server in ``self`` concurrently.
+
+        Returns:
+            dict: server record -> ``((exit_code, stdout, stderr), error)``
+            where ``error`` is the exception raised while connecting or
+            executing, or None.
+        """
+        connections = [server._get_ssh_connection() for server in self]
+
+        def execute(conn):
+            with conn as ssh:
+                return ssh.execute(command)
+
+        return dict(zip(self, run_parallel(execute, connections)))
+
+    def action_test_connection(self):
+        """Test SSH connection to the server."""
+        if len(self) > 1:
+            return self._test_connection_many()
+        self.ensure_one()
+        try:
+            ssh_ip = self._get_ssh_ip()
+            ssh_port = self.ssh_port or 22
+            try:
+                tcp_probe(ssh_ip, ssh_port)
+            except OSError as e:
+                raise UserError(
+                    _("TCP connect to %s:%s failed: %s") % (ssh_ip, ssh_port, e)
+                )
+            with self._get_ssh_connection() as ssh:
+                exit_code, stdout, stderr = ssh.execute(
+                    'echo "Connection OK" && hostname'
+                )
+            if exit_code == 0:
+                return {
+                    'type': 'ir.actions.client',
+                    'tag': 'display_notification',
+                    'params': {
+                        'title': _("Connection Successful"),
+                        'message': _(
+                            "SSH connection to %s succeeded. Hostname: %s"
+                        ) % (ssh_ip, stdout.strip()),
+                        'type': 'success',
+                        'sticky': False,
+                    },
+                }
+            else:
+                raise UserError(
+                    _("Connection test command failed:\n%s") % stderr
+                )
+        except (UserError, ValidationError):
+            raise
+        except Exception as e:
+            raise UserError(
+                _("SSH connection failed:\n%s") % str(e)
+            )
+
+    def _test_connection_many(self):
+        """Test SSH connections to several servers concurrently.
+
+        Servers are first probed with a plain TCP connect so that unreachable
+        hosts fail fast and only reachable ones get an SSH handshake.
+        """
+        addresses = [(server._get_ssh_ip(), server.ssh_port or 22) for server in self]
+        probes = run_parallel(lambda address: tcp_probe(*address), addresses)
+        errors = []
+        reachable = self.browse()
+        for server, address, (_result, error) in zip(self, addresses, probes):
+            if error is not None:
+                errors.append(
+                    _("%s: TCP connect to %s:%s failed: %s")
+                    % (server.name, address[0], address[1], error)
+                )
+            else:
+                reachable |= server
+
+        results = reachable._ssh_execute_parallel('echo "Connection OK" && hostname')
+        for server, (result, error) in results.items():
+            if error is not None:
+                errors.append(_("%s: SSH connection failed: %s") % (server.name, error))
+            elif result[0] != 0:
+                errors.append(
+                    _("%s: connection test command failed: %s") % (server.name, result[2])
+                )
+        if errors:
+            raise UserError('\n'.join(errors))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Connection Successful"),
+                'message': _("SSH connection succeeded for %d servers.") % len(self),
+                'type': 'success',
+                'sticky': False,
+            },
+        }
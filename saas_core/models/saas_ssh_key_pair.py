@@ -1,4 +1,7 @@
-from odoo import fields, models
+from odoo import fields, models, tools, _
+from odoo.exceptions import UserError
+
+from ..utils import load_private_key
 
 
 class SaasSshKeyPair(models.Model):
@@ -38,3 +41,20 @@ class SaasSshKeyPair(models.Model):
         string='Upload Filename',
         help='Filename detected during upload (internal use).',
     )
+
+    @tools.ormcache('self.id', 'self.write_date')
+    def _get_paramiko_pkey(self):
+        """Return the private key parsed as a paramiko key.
+
+        Parsing is cached per key pair and version, so repeated SSH
+        connections skip the base64 decode and PEM parse; uploading a new
+        key bumps ``write_date`` and thus misses the cache.
+        """
+        self.ensure_one()
+        try:
+            return load_private_key(self.private_key_file, self.type or 'rsa')
+        except Exception as e:
+            raise UserError(
+                _("Unable to load the private key of SSH key pair '%s':\n%s")
+                % (self.name, e)
+            )
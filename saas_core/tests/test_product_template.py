@@ -0,0 +1,23 @@
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestProductTemplate(TransactionCase):
+
+    def test_unlink_module_updates_bundle_count(self):
+        Product = self.env['product.template']
+        modules = Product.create([
+            {'name': 'Test Module A', 'saas_type': 'module', 'technical_name': 'test_saas_module_a'},
+            {'name': 'Test Module B', 'saas_type': 'module', 'technical_name': 'test_saas_module_b'},
+        ])
+        bundle = Product.create({
+            'name': 'Test Bundle',
+            'saas_type': 'bundle',
+            'saas_module_ids': [Command.set(modules.ids)],
+        })
+        self.assertEqual(bundle.saas_module_count, 2)
+
+        modules[0].unlink()
+        self.assertEqual(bundle.saas_module_count, 1)
+        self.assertEqual(bundle.saas_module_ids, modules[1])
@@ -0,0 +1,44 @@
+from unittest.mock import patch
+
+from odoo.tests import BaseCase, tagged
+
+from .. import utils
+
+
+class _FakeChannel:
+    """Channel whose last output and EOF arrive right after the ready checks."""
+
+    def __init__(self):
+        self.eof_received = False
+        self.closed = False
+        self.stdout = b''
+        self.stderr = b''
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv_stderr_ready(self):
+        ready = bool(self.stderr)
+        if not self.eof_received:
+            # The transport thread delivers the tail and EOF at this point
+            self.stdout, self.stderr = b'last line\n', b'warning\n'
+            self.eof_received = True
+        return ready
+
+    def recv(self, size):
+        data, self.stdout = self.stdout[:size], self.stdout[size:]
+        return data
+
+    def recv_stderr(self, size):
+        data, self.stderr = self.stderr[:size], self.stderr[size:]
+        return data
+
+
+@tagged('post_install', '-at_install')
+class TestIterChannel(BaseCase):
+
+    def test_output_arriving_with_eof_is_read(self):
+        channel = _FakeChannel()
+        with patch.object(utils.select, 'select', return_value=([channel], [], [])):
+            chunks = list(utils._iter_channel(channel, timeout=1))
+        self.assertEqual(chunks, [(False, b'last line\n'), (True, b'warning\n')])
@@ -1,15 +1,302 @@
+import atexit
 import base64
+import hashlib
+import io
+import json
 import logging
 import os
-import stat
-import tempfile
+import select
+import shlex
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-import paramiko
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 _logger = logging.getLogger(__name__)
 
 SSH_COMMAND_TIMEOUT = 120  # seconds
 SSH_CONNECT_TIMEOUT = 30  # seconds
+TCP_PROBE_TIMEOUT = 3  # seconds
+SSH_MAX_PARALLEL = 16  # max concurrent SSH sessions for fan-out helpers
+SSH_POOL_MAX_IDLE = 8  # max idle clients kept per (host, port, user, key)
+SSH_POOL_IDLE_TIMEOUT = 300  # seconds before an idle pooled client is dropped
+SSH_KEEPALIVE_INTERVAL = 30  # seconds between keepalives on an open transport
+
+# Idle authenticated clients, keyed by (host, port, user, key fingerprint).
+# Each value is a LIFO list of (client, released_at) tuples.
+_ssh_pool = {}
+_ssh_pool_pid = os.getpid()
+_ssh_pool_lock = threading.Lock()
+
+
+def run_parallel(func, items, max_workers=SSH_MAX_PARALLEL):
+    """Call ``func(item)`` for each item concurrently in a thread pool.
+
+    Meant for fanning out blocking SSH work over several servers. ``func``
+    must not touch the caller's environment (environments and cursors are
+    not thread-safe): read everything it needs beforehand and apply the
+    results afterwards, or have it open its own cursor.
+
+    Returns:
+        list: one ``(result, exception)`` tuple per item, in input order.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as exc:
+            return None, exc
+
+    if len(items) == 1:
+        return [call(items[0])]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(call, items))
+
+
+class SSHCommandError(Exception):
+    """Raised by :meth:`SSHConnection.execute_iter` when the command fails."""
+
+    def __init__(self, exit_code, stderr):
+        super().__init__("Command exited with status %s: %s" % (exit_code, stderr))
+        self.exit_code = exit_code
+        self.stderr = stderr
+
+
+class SSHTimeoutError(TimeoutError):
+    """Raised when a remote command does not finish within its timeout.
+
+    The channel is closed, so a hung command no longer holds the worker.
+    """
+
+
+def tcp_probe(host, port, timeout=TCP_PROBE_TIMEOUT):
+    """Open and close a plain TCP connection to check that ``host:port`` is reachable.
+
+    Much cheaper than an SSH handshake against a dead host, which only gives
+    up after the banner timeout.
+
+    Raises:
+        OSError: if the connection cannot be established within ``timeout``.
+    """
+    with socket.create_connection((host, port), timeout=timeout):
+        pass
+
+
+# Each git command is one '&&' chain, so it costs a single SSH round trip.
+
+def git_clone_command(url, branch, path):
+    """Return a command replacing ``path`` with a shallow clone of ``branch``."""
+    return (
+        'mkdir -p %(parent)s && rm -rf %(path)s && '
+        'git clone --branch %(branch)s --single-branch '
+        '--depth 1 %(url)s %(path)s 2>&1 && '
+        '{ chmod -R 755 %(path)s || true; }'
+    ) % {
+        'parent': shlex.quote('/'.join(path.rsplit('/', 1)[:-1])),
+        'path': shlex.quote(path),
+        'branch': shlex.quote(branch),
+        'url': shlex.quote(url),
+    }
+
+
+def git_pull_command(url, branch, path):
+    """Return a command pulling ``branch`` into ``path``, resetting the remote URL first."""
+    return 'cd %s && git remote set-url origin %s && git pull origin %s 2>&1' % (
+        shlex.quote(path), shlex.quote(url), shlex.quote(branch),
+    )
+
+
+def _ssh_client_alive(client):
+    transport = client.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+    try:
+        transport.send_ignore()
+    except Exception:
+        return False
+    return True
+
+
+def _ssh_client_close(client):
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def _ssh_pool_acquire(key):
+    """Pop a live idle client for ``key`` from the pool, or return None."""
+    global _ssh_pool_pid
+    while True:
+        with _ssh_pool_lock:
+            if _ssh_pool_pid != os.getpid():
+                # Forked worker: the inherited sockets belong to the parent.
+                _ssh_pool.clear()
+                _ssh_pool_pid = os.getpid()
+            idle = _ssh_pool.get(key)
+            if not idle:
+                return None
+            client, released_at = idle.pop()
+        if (time.monotonic() - released_at < SSH_POOL_IDLE_TIMEOUT
+                and _ssh_client_alive(client)):
+            return client
+        _ssh_client_close(client)
+
+
+def _ssh_pool_release(key, client):
+    """Return ``client`` to the pool, closing it if dead or the pool is full."""
+    transport = client.get_transport()
+    if transport is not None and transport.is_active():
+        with _ssh_pool_lock:
+            if _ssh_pool_pid == os.getpid():
+                idle = _ssh_pool.setdefault(key, [])
+                if len(idle) < SSH_POOL_MAX_IDLE:
+                    idle.append((client, time.monotonic()))
+                    return
+    _ssh_client_close(client)
+
+
+def close_ssh_pool():
+    """Close every idle pooled SSH client."""
+    with _ssh_pool_lock:
+        clients = [client for idle in _ssh_pool.values() for client, _ts in idle]
+        _ssh_pool.clear()
+    for client in clients:
+        _ssh_client_close(client)
+
+
+atexit.register(close_ssh_pool)
+
+
+def _iter_channel(channel, timeout, chunk_size=32768):
+    """Yield ``(is_stderr, chunk)`` from ``channel`` until the command's EOF.
+
+    Both streams share the channel window, so reading one to the end before
+    the other can stall a command that writes a lot to the other one; this
+    reads whichever has data.
+
+    Raises:
+        socket.timeout: if nothing arrives for ``timeout`` seconds.
+    """
+    while True:
+        # Sampled before the ready checks: the transport buffers all data
+        # before flagging EOF, so once EOF is seen the buffers only drain.
+        eof = channel.eof_received or channel.closed
+        received = False
+        if channel.recv_ready():
+            yield False, channel.recv(chunk_size)
+            received = True
+        if channel.recv_stderr_ready():
+            yield True, channel.recv_stderr(chunk_size)
+            received = True
+        if received:
+            continue
+        if eof:
+            return
+        # The channel's fileno() becomes readable on data for either stream
+        if not select.select([channel], [], [], timeout)[0]:
+            raise socket.timeout()
+
+
+def _drain_channel(channel, timeout, tail_bytes=None):
+    """Read stdout and stderr of ``channel`` together until the command's EOF.
+
+    When ``tail_bytes`` is given only the last ``tail_bytes`` bytes of each
+    stream are kept.
+
+    Returns:
+        tuple: (stdout, stderr) as bytearrays, which callers decode directly
+        rather than copying them into bytes first.
+
+    Raises:
+        socket.timeout: as in :func:`_iter_channel`.
+    """
+    out, err = bytearray(), bytearray()
+    for is_stderr, chunk in _iter_channel(channel, timeout):
+        buf = err if is_stderr else out
+        buf += chunk
+        if tail_bytes:
+            del buf[:-tail_bytes]
+    return out, err
+
+
+@contextmanager
+def _command_deadline(channel, timeout):
+    """Turn a read timeout on ``channel`` into :class:`SSHTimeoutError`."""
+    try:
+        yield
+    except socket.timeout:
+        channel.close()
+        raise SSHTimeoutError(
+            "Remote command did not finish within %s seconds" % timeout
+        ) from None
+
+
+def _wait_exit_status(channel, timeout):
+    """Return the exit status of ``channel``, waiting at most ``timeout`` seconds.
+
+    Unlike ``recv_exit_status()``, this does not block forever when the
+    server closes the output streams but never reports a status.
+    """
+    if not channel.status_event.wait(timeout):
+        raise socket.timeout()
+    return channel.recv_exit_status()
+
+
+def _write_stdin(stdin, data):
+    """Send ``data`` to a remote command's stdin and signal EOF."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    stdin.write(data)
+    stdin.flush()
+    stdin.channel.shutdown_write()
+
+
+def _ordered_key_classes(key_type):
+    """Return (name, paramiko key class) pairs, the hinted type first."""
+    import paramiko
+    key_classes = [
+        ('rsa', paramiko.RSAKey),
+        ('ed25519', paramiko.Ed25519Key),
+        ('ecdsa', paramiko.ECDSAKey),
+    ]
+    if hasattr(paramiko, 'DSSKey'):
+        key_classes.append(('dsa', paramiko.DSSKey))
+    return sorted(key_classes, key=lambda kv: kv[0] != key_type)
+
+
+def _key_load_error(errors):
+    import paramiko
+    error_details = '; '.join('%s: %s' % (n, e) for n, e in errors)
+    return paramiko.SSHException(
+        "Unable to load private key (tried %s). Details: %s"
+        % (', '.join(n for n, _ in errors), error_details)
+    )
+
+
+def load_private_key(private_key_b64, key_type='rsa'):
+    """Decode a base64 PEM private key and parse it into a paramiko key.
+
+    The configured type is tried first, then the other supported types.
+    """
+    key_text = base64.b64decode(private_key_b64).decode()
+    errors = []
+    for name, cls in _ordered_key_classes(key_type):
+        try:
+            return cls.from_private_key(io.StringIO(key_text))
+        except Exception as exc:
+            errors.append((name, exc))
+    raise _key_load_error(errors)
 
 
 class SSHConnection:
@@ -20,18 +307,27 @@ class SSHConnection:
         with SSHConnection(host, port, user, private_key_b64, key_type) as ssh:
             exit_code, stdout, stderr = ssh.execute('ls -la')
             ssh.write_file('/remote/path/file.txt', 'file contents')
+
+    ``pkey`` may be given as an already parsed paramiko key, in which case
+    ``private_key_b64`` is not decoded again on connect.
+
+    Authenticated clients are pooled per host, port, user and key: leaving
+    the ``with`` block hands the client back to the pool and the next
+    connection to the same server reuses it instead of redoing the TCP
+    handshake and key exchange.
     """
 
-    def __init__(self, host, port, user, private_key_b64, key_type='rsa',
-                 timeout=SSH_COMMAND_TIMEOUT):
+    def __init__(self, host, port, user, private_key_b64=None, key_type='rsa',
+                 timeout=SSH_COMMAND_TIMEOUT, pkey=None):
         self.host = host
         self.port = port
         self.user = user
         self.private_key_b64 = private_key_b64
         self.key_type = key_type
         self.timeout = timeout
+        self.pkey = pkey
         self._client = None
-        self._key_tmpfile = None
+        self._pool_key_cache = None
 
     def __enter__(self):
         self._connect()
@@ -41,18 +337,47 @@ class SSHConnection:
         self._disconnect()
         return False
 
+    def _pool_key(self):
+        """Return (host, port, user, key fingerprint), computed once per connection."""
+        if self._pool_key_cache is None:
+            self._pool_key_cache = (self.host, self.port, self.user, self._key_fingerprint())
+        return self._pool_key_cache
+
+    def _key_fingerprint(self):
+        """Return the SHA-256 digest of the key.
+
+        For a parsed key the digest is stored on the key object itself, which
+        key pairs cache, so the key is serialized and hashed only once.
+        """
+        if self.pkey is not None:
+            fingerprint = getattr(self.pkey, '_saas_fingerprint', None)
+            if fingerprint is None:
+                fingerprint = hashlib.sha256(self.pkey.asbytes()).digest()
+                self.pkey._saas_fingerprint = fingerprint
+            return fingerprint
+        key = self.private_key_b64 or b''
+        if isinstance(key, str):
+            key = key.encode()
+        return hashlib.sha256(key).digest()
+
+    def same_target(self, other):
+        """Return whether ``other`` reaches the same host, port and user with the same key."""
+        return self._pool_key() == other._pool_key()
+
     def _connect(self):
-        """Decode the Binary field, write to temp file, connect via paramiko."""
-        key_bytes = base64.b64decode(self.private_key_b64)
+        """Reuse a pooled client, or parse the key in memory and connect via
+        paramiko."""
+        self._client = _ssh_pool_acquire(self._pool_key())
+        if self._client:
+            return
 
-        fd, self._key_tmpfile = tempfile.mkstemp(prefix='saas_ssh_', suffix='.pem')
-        try:
-            os.write(fd, key_bytes)
-        finally:
-            os.close(fd)
-        os.chmod(self._key_tmpfile, stat.S_IRUSR)
+        pkey = self.pkey
+        if pkey is None:
+            pkey = load_private_key(self.private_key_b64, self.key_type)
 
-        pkey = self._load_private_key(self._key_tmpfile)
+        # Imported here: paramiko pulls in cryptography/OpenSSL, which
+        # workers that never open an SSH connection should not pay for.
+        import paramiko
 
         self._client = paramiko.SSHClient()
         self._client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -62,82 +387,169 @@ class SSHConnection:
             username=self.user,
             pkey=pkey,
             timeout=SSH_CONNECT_TIMEOUT,
+            banner_timeout=SSH_CONNECT_TIMEOUT,
+            auth_timeout=SSH_CONNECT_TIMEOUT,
             look_for_keys=False,
             allow_agent=False,
         )
-
-    def _load_private_key(self, path):
-        """Load a private key file, trying the configured type first then auto-detecting."""
-        key_classes = [
-            ('rsa', paramiko.RSAKey),
-            ('ed25519', paramiko.Ed25519Key),
-            ('ecdsa', paramiko.ECDSAKey),
-        ]
-        if hasattr(paramiko, 'DSSKey'):
-            key_classes.append(('dsa', paramiko.DSSKey))
-
-        # Try the hinted key type first
-        ordered = sorted(key_classes, key=lambda kv: kv[0] != self.key_type)
-
-        errors = []
-        for name, cls in ordered:
-            try:
-                return cls.from_private_key_file(path)
-            except Exception as exc:
-                errors.append((name, exc))
-
-        error_details = '; '.join('%s: %s' % (n, e) for n, e in errors)
-        raise paramiko.SSHException(
-            "Unable to load private key (tried %s). Details: %s"
-            % (', '.join(n for n, _ in errors), error_details)
-        )
+        # Keepalives stop NAT/firewalls from silently dropping pooled idle
+        # sessions; NODELAY sends small command requests without waiting
+        # to coalesce them (Nagle).
+        transport = self._client.get_transport()
+        transport.set_keepalive(SSH_KEEPALIVE_INTERVAL)
+        try:
+            transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (AttributeError, OSError):
+            pass  # not a TCP socket (e.g. a proxy command)
 
     def _disconnect(self):
-        """Close SSH client and remove temp key file."""
+        """Return the SSH client to the pool."""
         if self._client:
-            try:
-                self._client.close()
-            except Exception:
-                pass
+            _ssh_pool_release(self._pool_key(), self._client)
             self._client = None
-        if self._key_tmpfile and os.path.exists(self._key_tmpfile):
-            try:
-                os.unlink(self._key_tmpfile)
-            except Exception:
-                pass
-            self._key_tmpfile = None
-
-    def execute(self, command, timeout=None):
+
+    def execute(self, command, timeout=None, tail_bytes=None, stdin_data=None):
         """Execute a command over SSH.
 
+        When ``tail_bytes`` is given only the last ``tail_bytes`` bytes of
+        stdout and stderr are kept while reading, for chatty commands whose
+        output is only logged.
+
+        ``stdin_data`` (str or bytes) is written to the command's stdin,
+        which is then closed.
+
         Returns:
             tuple: (exit_code, stdout_str, stderr_str)
+
+        Raises:
+            SSHTimeoutError: if the command stays silent or does not exit
+                within ``timeout`` seconds.
         """
         _logger.info("SSH [%s@%s:%s] executing command", self.user, self.host, self.port)
-        stdin, stdout, stderr = self._client.exec_command(
-            command, timeout=timeout or self.timeout,
+        timeout = timeout or self.timeout
+        stdin, stdout, stderr = self._client.exec_command(command, timeout=timeout)
+        with _command_deadline(stdout.channel, timeout):
+            if stdin_data is not None:
+                _write_stdin(stdin, stdin_data)
+            # Read output BEFORE the exit status to avoid deadlock when the
+            # remote command produces large output that fills the SSH buffer.
+            out, err = _drain_channel(stdout.channel, timeout, tail_bytes)
+            exit_code = _wait_exit_status(stdout.channel, timeout)
+        return (
+            exit_code,
+            out.decode('utf-8', errors='replace'),
+            err.decode('utf-8', errors='replace'),
         )
-        # Read output BEFORE recv_exit_status to avoid deadlock when the
-        # remote command produces large output that fills the SSH buffer.
-        stdout_str = stdout.read().decode('utf-8', errors='replace')
-        stderr_str = stderr.read().decode('utf-8', errors='replace')
-        exit_code = stdout.channel.recv_exit_status()
-        return exit_code, stdout_str, stderr_str
+
+    def execute_bytes(self, command, timeout=None, stdin_data=None):
+        """Execute a command over SSH and return its stdout undecoded.
+
+        For commands producing binary output, such as a tar stream.
+        ``stdin_data`` is handled as in :meth:`execute`.
+
+        Returns:
+            tuple: (exit_code, stdout_bytes, stderr_str)
+
+        Raises:
+            SSHTimeoutError: as in :meth:`execute`.
+        """
+        _logger.info("SSH [%s@%s:%s] executing command", self.user, self.host, self.port)
+        timeout = timeout or self.timeout
+        stdin, stdout, stderr = self._client.exec_command(command, timeout=timeout)
+        with _command_deadline(stdout.channel, timeout):
+            if stdin_data is not None:
+                _write_stdin(stdin, stdin_data)
+            out, err = _drain_channel(stdout.channel, timeout)
+            exit_code = _wait_exit_status(stdout.channel, timeout)
+        return exit_code, bytes(out), err.decode('utf-8', errors='replace')
+
+    def execute_iter(self, command, timeout=None, stdin_data=None):
+        """Execute a command over SSH and yield its stdout line by line.
+
+        Lines are read from the channel as they arrive instead of buffering
+        the whole output, so memory stays proportional to one line.
+        ``stdin_data`` is handled as in :meth:`execute`.
+
+        Raises:
+            SSHCommandError: once stdout is exhausted, if the command exited
+                with a non-zero status.
+            SSHTimeoutError: as in :meth:`execute`.
+        """
+        _logger.info("SSH [%s@%s:%s] executing command", self.user, self.host, self.port)
+        timeout = timeout or self.timeout
+        channel = self._client.get_transport().open_session()
+        try:
+            with _command_deadline(channel, timeout):
+                channel.settimeout(timeout)
+                channel.exec_command(command)
+                if stdin_data is not None:
+                    _write_stdin(channel.makefile_stdin('wb'), stdin_data)
+                # stderr is buffered in the same loop, so it never stalls
+                # the stdout lines being consumed.
+                pending, err = bytearray(), bytearray()
+                for is_stderr, chunk in _iter_channel(channel, timeout):
+                    if is_stderr:
+                        err += chunk
+                        continue
+                    pending += chunk
+                    start = 0
+                    while (end := pending.find(b'\n', start)) != -1:
+                        yield pending[start:end + 1].decode('utf-8', errors='replace')
+                        start = end + 1
+                    del pending[:start]
+                if pending:
+                    yield pending.decode('utf-8', errors='replace')
+                exit_code = _wait_exit_status(channel, timeout)
+        finally:
+            channel.close()
+        if exit_code != 0:
+            raise SSHCommandError(exit_code, err.decode('utf-8', errors='replace'))
 
     def write_file(self, remote_path, content):
         """Write string content to a remote file via SFTP."""
-        sftp = self._client.open_sftp()
+        self.write_files({remote_path: content})
+
+    def _get_sftp(self):
+        """Return the SFTP session of the underlying client, opening it once.
+
+        The session is kept on the paramiko client, so it is reused by every
+        later connection that gets the same client from the pool.
+        """
+        sftp = getattr(self._client, '_saas_sftp', None)
+        if sftp is None or sftp.get_channel().closed:
+            sftp = self._client._saas_sftp = self._client.open_sftp()
+        return sftp
+
+    @contextmanager
+    def _sftp_session(self):
+        """Yield the cached SFTP session, dropping it if a transfer fails."""
+        sftp = self._get_sftp()
         try:
-            with sftp.file(remote_path, 'w') as f:
-                f.write(content)
-        finally:
+            yield sftp
+        except Exception:
+            self._client._saas_sftp = None
             sftp.close()
+            raise
+
+    def write_files(self, files):
+        """Write several ``{remote_path: content}`` files in one SFTP session.
+
+        Uploads go through ``putfo``, which pipelines the write requests
+        instead of waiting for each one to be acknowledged.
+        """
+        with self._sftp_session() as sftp:
+            for remote_path, content in files.items():
+                if isinstance(content, str):
+                    content = content.encode('utf-8')
+                sftp.putfo(io.BytesIO(content), remote_path)
 
     def read_file_bytes(self, remote_path):
-        """Read a remote file and return its contents as bytes via SFTP."""
-        sftp = self._client.open_sftp()
-        try:
-            with sftp.file(remote_path, 'rb') as f:
-                return f.read()
-        finally:
-            sftp.close()
+        """Read a remote file and return its contents as bytes via SFTP.
+
+        ``getfo`` prefetches the file, keeping many read requests in flight
+        instead of waiting one round trip per 32 KB block.
+        """
+        buf = io.BytesIO()
+        with self._sftp_session() as sftp:
+            sftp.getfo(remote_path, buf)
+        return buf.getvalue()